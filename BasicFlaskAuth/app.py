@@ -1,11 +1,14 @@
 from flask import Flask, request, abort
-import json
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from fsnd_common.auth import JWKSCache, TokenCache
+from fsnd_common.instrumentation import init_metrics, timed
 
 
 app = Flask(__name__)
+# GET /metrics when the METRICS_ENABLED environment variable is set
+init_metrics(app)
 
 AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
 ALGORITHMS = ['RS256']
@@ -51,26 +54,18 @@ def get_token_auth_header():
     return token
 
 
+jwks_cache = JWKSCache(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = jwks_cache.get_key(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -105,15 +100,22 @@ def verify_decode_jwt(token):
             }, 400)
 
 
+token_cache = TokenCache()
+
+
 def requires_auth(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         token = get_token_auth_header()
-        try:
-            payload = verify_decode_jwt(token)
-        except:
-            abort(401)
-        return f(payload, *args, **kwargs)
+        cached = token_cache.get(token)
+        if cached is None:
+            try:
+                with timed('jwt_verify'):
+                    payload = verify_decode_jwt(token)
+            except:
+                abort(401)
+            cached = token_cache.put(token, payload)
+        return f(cached[0], *args, **kwargs)
 
     return wrapper
 
@@ -1,6 +1,8 @@
 from flask import Flask, request, jsonify, abort
+from fsnd_common.json_backend import init_json
 
 app = Flask(__name__)
+init_json(app)
 
 greetings = {
             'en': 'hello', 
@@ -0,0 +1,8 @@
+'''
+Helpers shared by the Flask projects of this repository.
+
+Each project installs this package from its requirements.txt and imports
+the modules it needs, e.g. `from fsnd_common.pool import SQLAlchemy`.
+Modules only import the optional packages they use, such as
+Flask-SQLAlchemy for pool.
+'''
@@ -0,0 +1,198 @@
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.request import urlopen
+
+# Seconds a fetched key set is trusted before it is fetched again
+JWKS_TTL = 600
+# Minimum seconds between refreshes forced by an unknown key id
+JWKS_MIN_REFRESH_INTERVAL = 30
+# Maximum number of verified tokens kept by a TokenCache
+TOKEN_CACHE_SIZE = 1024
+
+
+def _is_rsa_signing_key(key):
+    # A key set can also publish encryption keys, keys of other types or
+    # entries missing members; none of them can verify an RS256 token
+    return (isinstance(key, dict) and key.get('kty') == 'RSA' and
+            key.get('use', 'sig') == 'sig' and
+            all(key.get(name) for name in ('kid', 'n', 'e')))
+
+
+class JWKSCache:
+    """Process-wide cache of the signing keys published at a JWKS url.
+
+    Keys are indexed by `kid` and kept for `ttl` seconds. Only RSA keys
+    meant for signatures are kept. Only one thread fetches the key set at
+    a time; the others wait for it and reuse the result. A token signed
+    with an unknown `kid` forces a refresh (the keys may have been
+    rotated), at most once every `min_refresh_interval` seconds.
+    """
+
+    def __init__(self, url, ttl=JWKS_TTL,
+                 min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL, timeout=5):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_key(self, kid):
+        """Returns the RSA key for the given key id, or None if unknown.
+
+        A lookup counts as a hit only when it needed no fetch.
+        """
+        fetched = False
+        if time.monotonic() >= self._expires_at:
+            fetched = self._refresh(self._generation)
+
+        key = self._keys.get(kid)
+        if key is None:
+            self.misses += 1
+            if self._refresh(self._generation, force=True):
+                key = self._keys.get(kid)
+        elif fetched:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key
+
+    def _refresh(self, generation, force=False):
+        """Fetches the key set unless another thread already did it.
+
+        Returns True if the keys changed since `generation` was read.
+        """
+        with self._lock:
+            if self._generation != generation:
+                return True
+
+            now = time.monotonic()
+            if force:
+                if (self._fetched_at is not None and
+                        now - self._fetched_at < self.min_refresh_interval):
+                    return False
+            elif now < self._expires_at:
+                return False
+
+            try:
+                jsonurl = urlopen(self.url, timeout=self.timeout)
+                jwks = json.loads(jsonurl.read())
+            except Exception:
+                if not self._keys:
+                    raise
+                # Keep serving the keys we have and retry a bit later
+                self._fetched_at = now
+                self._expires_at = now + self.min_refresh_interval
+                return False
+
+            self._keys = {
+                key['kid']: {
+                    'kty': 'RSA',
+                    'kid': key['kid'],
+                    'use': 'sig',
+                    'n': key['n'],
+                    'e': key['e']
+                }
+                for key in jwks.get('keys', ())
+                if _is_rsa_signing_key(key)
+            }
+            self._fetched_at = now
+            self._expires_at = now + self.ttl
+            self._generation += 1
+            self.refreshes += 1
+            return True
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'keys': len(self._keys)
+        }
+
+
+class TokenCache:
+    """Bounded LRU of tokens that already passed verification.
+
+    Entries are keyed by the SHA-256 of the token and hold the decoded
+    payload plus its permissions as a set. An entry is dropped once the
+    token's `exp` has passed, so an expired token is never served; tokens
+    without `exp` are not cached at all. Payloads are copied in and out,
+    so a view changing the payload it was given cannot change what later
+    requests with the same token see.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        """Returns (payload, permissions) for a cached token, or None
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() >= entry[0]:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(entry[1]), entry[2]
+
+    def put(self, token, payload):
+        """Caches a verified payload and returns (payload, permissions)
+        """
+        permissions = frozenset(payload.get('permissions', ()))
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)) or self.maxsize <= 0:
+            return payload, permissions
+
+        key = self._key(token)
+        entry = (exp, copy.deepcopy(payload), permissions)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return payload, permissions
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
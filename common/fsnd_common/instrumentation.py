@@ -0,0 +1,387 @@
+import cProfile
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import (Response, abort, current_app, g, has_app_context,
+                   has_request_context, jsonify, request, send_from_directory)
+from flask.signals import (before_render_template, signals_available,
+                           template_rendered)
+
+from .monitoring import requires_monitoring_token
+
+try:
+    from . import sql_events
+except ImportError:  # apps without a database have no SQL to measure
+    sql_events = None
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0)
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+# Setting -> (type, default). Each setting is read from the app config,
+# then from the environment.
+METRICS_SETTINGS = {
+    # Instrumentation is off unless this is set
+    'METRICS_ENABLED': (_bool, False),
+    # Fraction of requests run under cProfile
+    'METRICS_PROFILE_RATE': (float, 0.01),
+    # Profiled requests at least this slow, in seconds, are dumped
+    'METRICS_SLOW_REQUEST': (float, 0.5),
+    # Where the .prof dumps go, and how many of the newest are kept
+    'METRICS_PROFILE_DIR': (str, os.path.join(tempfile.gettempdir(),
+                                              'flask-profiles')),
+    'METRICS_PROFILE_KEEP': (int, 20),
+}
+# Endpoints serving the metrics, which are not measured themselves
+METRICS_ENDPOINTS = ('metrics', 'metrics_profiles', 'metrics_profile')
+
+
+def _setting(config, name):
+    type, default = METRICS_SETTINGS[name]
+    value = config.get(name, os.environ.get(name))
+    if value is None or value == '':
+        return default
+    return type(value)
+
+
+class Histogram:
+    '''
+    Prometheus histogram with one series per combination of label values.
+    '''
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += seconds
+            series[2] += 1
+
+    def exposition(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for
+                      labels, (counts, total, count) in self._series.items()]
+        for label_values, counts, total, count in sorted(series):
+            pairs = list(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _labels(pairs, le=bound), cumulative))
+            lines.append('{}_bucket{} {}'.format(
+                self.name, _labels(pairs, le='+Inf'), count))
+            lines.append('{}_sum{} {}'.format(
+                self.name, _labels(pairs), total))
+            lines.append('{}_count{} {}'.format(
+                self.name, _labels(pairs), count))
+        return lines
+
+
+class Counter:
+    '''
+    Prometheus counter with one series per combination of label values.
+    '''
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount, *label_values):
+        with self._lock:
+            self._series[label_values] = \
+                self._series.get(label_values, 0) + amount
+
+    def exposition(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} counter'.format(self.name)]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, value in series:
+            lines.append('{}{} {}'.format(
+                self.name, _labels(zip(self.labels, label_values)), value))
+        return lines
+
+
+def _labels(pairs, **extra):
+    pairs = list(pairs) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs) + '}'
+
+
+class Metrics:
+    '''
+    The request, SQL, JWT and template timings of one app, created by
+    init_metrics() and kept in app.extensions['metrics'].
+    '''
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.requests = Histogram(
+            'http_request_duration_seconds', 'Request latency.',
+            ('endpoint', 'method', 'status'))
+        self.sql_statements = Counter(
+            'sql_statements_total', 'SQL statements executed.',
+            ('endpoint',))
+        self.sql_seconds = Histogram(
+            'sql_statement_duration_seconds', 'SQL statement latency.',
+            ('endpoint',))
+        self.timings = Histogram(
+            'operation_duration_seconds',
+            'Latency of instrumented operations such as JWT verification.',
+            ('operation',))
+        self.templates = Histogram(
+            'template_render_duration_seconds', 'Template render time.',
+            ('template',))
+        self.profiles = Counter(
+            'slow_request_profiles_total',
+            'cProfile dumps written for slow requests.', ('endpoint',))
+
+    def exposition(self):
+        lines = []
+        for metric in (self.requests, self.sql_statements, self.sql_seconds,
+                       self.timings, self.templates, self.profiles):
+            lines.extend(metric.exposition())
+        return '\n'.join(lines) + '\n'
+
+
+def current_metrics():
+    '''
+    The Metrics of the current app, or None outside an app context and
+    for apps without METRICS_ENABLED.
+    '''
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('metrics')
+
+
+@contextmanager
+def timed(operation):
+    '''
+    Records the duration of the block under `operation`, e.g.
+    `with timed('jwt_verify'): ...`. Costs nothing while the current app
+    has metrics off.
+    '''
+    metrics = current_metrics()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings.observe(time.perf_counter() - started, operation)
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'none'
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters,
+                           context, executemany):
+    metrics = current_metrics()
+    if metrics is not None:
+        connection.info.setdefault('metrics_started', []).append(
+            (metrics, time.perf_counter()))
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters,
+                          context, executemany):
+    started = connection.info.get('metrics_started')
+    if not started:
+        return
+    metrics, started = started.pop()
+    endpoint = _endpoint()
+    metrics.sql_seconds.observe(time.perf_counter() - started, endpoint)
+    metrics.sql_statements.inc(1, endpoint)
+
+
+def _handle_error(context):
+    if context.connection is None:
+        return
+    started = context.connection.info.get('metrics_started')
+    if started:
+        started.pop()
+
+
+if sql_events is not None:
+    sql_events.listen('before_cursor_execute', _before_cursor_execute)
+    sql_events.listen('after_cursor_execute', _after_cursor_execute)
+    sql_events.listen('handle_error', _handle_error)
+
+
+def _before_render_template(app, template, context, **extra):
+    if has_request_context():
+        g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+
+def _template_rendered(app, template, context, **extra):
+    started = g.get('metrics_templates') if has_request_context() else None
+    if started:
+        app.extensions['metrics'].templates.observe(
+            time.perf_counter() - started.pop(), template.name or 'string')
+
+
+class _Profiler:
+    # One request at a time is profiled: cProfile profiles a single thread
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def start(self, rate):
+        if rate <= 0 or random.random() >= rate:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile):
+        profile.disable()
+        self._lock.release()
+
+    def dump(self, profile, directory, keep, name):
+        os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(os.path.join(directory, name))
+        dumps = sorted(_profile_names(directory))
+        for old in dumps[:-keep] if keep > 0 else dumps:
+            os.remove(os.path.join(directory, old))
+
+
+_profiler = _Profiler()
+
+
+def _profile_names(directory):
+    if not os.path.isdir(directory):
+        return []
+    return [name for name in os.listdir(directory) if name.endswith('.prof')]
+
+
+def init_metrics(app):
+    '''
+    Instruments app when METRICS_ENABLED is set in its config or the
+    environment: per-endpoint latency histograms, SQL statement counts and
+    latency, operations wrapped in timed() (JWT verification), template
+    render times, served in the Prometheus text format at GET /metrics.
+    Other apps of the process are not instrumented.
+
+    The latency of a streamed response is recorded when the server closes
+    it, so it includes generating the body.
+
+    A METRICS_PROFILE_RATE share of requests runs under cProfile; the
+    ones slower than METRICS_SLOW_REQUEST seconds are dumped to
+    METRICS_PROFILE_DIR, listed at GET /metrics/profiles and downloaded
+    from GET /metrics/profiles/<name> (open them with pstats or snakeviz).
+    Those two need the MONITORING_TOKEN, see monitoring.py. A streamed
+    response is only profiled until its view returns.
+    '''
+    if not _setting(app.config, 'METRICS_ENABLED'):
+        return
+    settings = {name: _setting(app.config, name) for name in METRICS_SETTINGS}
+    metrics = app.extensions['metrics'] = Metrics(settings)
+    if signals_available:  # template timings need blinker
+        before_render_template.connect(_before_render_template, app)
+        template_rendered.connect(_template_rendered, app)
+
+    @app.before_request
+    def start_request_timer():
+        if request.endpoint in METRICS_ENDPOINTS:
+            return
+        g.metrics_started = time.perf_counter()
+        g.metrics_profile = _profiler.start(settings['METRICS_PROFILE_RATE'])
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = _endpoint()
+        labels = (endpoint, request.method, str(response.status_code))
+        seconds = time.perf_counter() - started
+
+        if response.is_streamed:
+            @response.call_on_close
+            def record_streamed_request():
+                metrics.requests.observe(
+                    time.perf_counter() - started, *labels)
+        else:
+            metrics.requests.observe(seconds, *labels)
+
+        profile = g.pop('metrics_profile', None)
+        if profile is not None:
+            _profiler.stop(profile)
+            if seconds >= settings['METRICS_SLOW_REQUEST']:
+                _profiler.dump(profile, settings['METRICS_PROFILE_DIR'],
+                               settings['METRICS_PROFILE_KEEP'],
+                               '{:.6f}-{}-{}ms.prof'.format(
+                                   time.time(), endpoint,
+                                   int(seconds * 1000)))
+                metrics.profiles.inc(1, endpoint)
+        return response
+
+    @app.teardown_request
+    def stop_profiler(error=None):
+        # after_request did not run, e.g. on an unhandled exception
+        profile = g.pop('metrics_profile', None)
+        if profile is not None:
+            _profiler.stop(profile)
+
+    @app.route('/metrics', endpoint='metrics', methods=['GET'])
+    def get_metrics():
+        return Response(metrics.exposition(),
+                        mimetype='text/plain; version=0.0.4')
+
+    @app.route('/metrics/profiles', endpoint='metrics_profiles',
+               methods=['GET'])
+    @requires_monitoring_token
+    def get_profiles():
+        return jsonify({
+            'success': True,
+            'profiles': sorted(
+                _profile_names(settings['METRICS_PROFILE_DIR']),
+                reverse=True),
+        })
+
+    @app.route('/metrics/profiles/<name>', endpoint='metrics_profile',
+               methods=['GET'])
+    @requires_monitoring_token
+    def get_profile(name):
+        if name not in _profile_names(settings['METRICS_PROFILE_DIR']):
+            abort(404)
+        return send_from_directory(settings['METRICS_PROFILE_DIR'], name,
+                                   as_attachment=True)
@@ -0,0 +1,78 @@
+import datetime
+import decimal
+import os
+
+from flask.json import JSONEncoder, JSONDecoder
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib json module is used without it
+    orjson = None
+
+# Value of the JSON_BACKEND setting that selects this module; any other
+# value keeps Flask's default encoder
+JSON_BACKEND = 'orjson'
+
+
+def _default(o):
+    # Types neither encoder handles itself, written the same way by both
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, (datetime.date, datetime.time)):
+        return o.isoformat()
+    raise TypeError('{} is not JSON serializable'.format(type(o).__name__))
+
+
+class FastJSONEncoder(JSONEncoder):
+    '''
+    Flask JSON encoder serializing with orjson, or with the stdlib when
+    orjson is not installed or cannot encode a value (e.g. an integer
+    beyond 64 bits).
+
+    Both write dates and datetimes in ISO 8601, as orjson does, rather
+    than Flask's HTTP date format, and Decimals as strings. orjson always
+    writes UTF-8 instead of \\u escapes, whatever JSON_AS_ASCII says.
+    '''
+
+    def default(self, o):
+        try:
+            return _default(o)
+        except TypeError:
+            return super().default(o)
+
+    def encode(self, o):
+        if orjson is None:
+            return super().encode(o)
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(o, default=_default, option=option).decode()
+        except orjson.JSONEncodeError:
+            return super().encode(o)
+
+
+class FastJSONDecoder(JSONDecoder):
+    '''
+    Flask JSON decoder parsing request bodies with orjson when installed.
+    '''
+
+    def decode(self, s):
+        if orjson is None:
+            return super().decode(s)
+        return orjson.loads(s)
+
+
+def init_json(app):
+    '''
+    Installs the orjson encoder and decoder on app when its JSON_BACKEND
+    setting, read from the app config or the environment, is 'orjson'
+    (the default). JSON_BACKEND=json keeps Flask's stdlib encoder.
+    '''
+    backend = app.config.get('JSON_BACKEND',
+                             os.environ.get('JSON_BACKEND', JSON_BACKEND))
+    if backend == JSON_BACKEND:
+        app.json_encoder = FastJSONEncoder
+        app.json_decoder = FastJSONDecoder
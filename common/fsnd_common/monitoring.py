@@ -0,0 +1,41 @@
+import hmac
+import os
+from functools import wraps
+
+from flask import abort, current_app, request
+
+# Bearer token the monitoring endpoints (pool metrics, request metrics and
+# profiles) require, read from the app config, then from the environment.
+# Without it those endpoints answer 404.
+MONITORING_TOKEN_SETTING = 'MONITORING_TOKEN'
+
+
+def monitoring_token(config):
+    return (config.get(MONITORING_TOKEN_SETTING) or
+            os.environ.get(MONITORING_TOKEN_SETTING) or None)
+
+
+def is_monitoring_request():
+    '''
+    Whether the request carries `Authorization: Bearer <MONITORING_TOKEN>`.
+    '''
+    token = monitoring_token(current_app.config)
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        given.strip().encode(), token.encode())
+
+
+def requires_monitoring_token(view):
+    '''
+    Decorator serving a monitoring view only to requests authenticated
+    with the MONITORING_TOKEN: 404 when no token is configured, 401 when
+    the request does not carry it.
+    '''
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not monitoring_token(current_app.config):
+            abort(404)
+        if not is_monitoring_request():
+            abort(401)
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+
+import flask_sqlalchemy
+from sqlalchemy import exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds, in seconds, of the checkout latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+# Setting -> (engine option, type, default). Each setting is read from the
+# app config, then from the environment.
+POOL_SETTINGS = {
+    'DB_POOL_SIZE': ('pool_size', int, 5),
+    'DB_MAX_OVERFLOW': ('max_overflow', int, 10),
+    'DB_POOL_TIMEOUT': ('pool_timeout', float, 30),
+    # Replace connections before a server or proxy drops them for idleness
+    'DB_POOL_RECYCLE': ('pool_recycle', int, 1800),
+    # Test connections on checkout so a failover costs no failed requests
+    'DB_POOL_PRE_PING': ('pool_pre_ping', _bool, True),
+}
+# Milliseconds a PostgreSQL statement may run before it is cancelled, 0 for
+# no limit
+STATEMENT_TIMEOUT_SETTING = 'DB_STATEMENT_TIMEOUT'
+
+
+def _setting(config, name, type, default):
+    value = (config or {}).get(name, os.environ.get(name))
+    if value is None or value == '':
+        return default
+    return type(value)
+
+
+def engine_options(database_uri, config=None):
+    '''
+    create_engine() options for the pool settings in config or the
+    environment. In-memory SQLite databases keep their single connection.
+    '''
+    url = make_url(database_uri)
+    backend = url.get_backend_name()
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+
+    options = {'poolclass': InstrumentedQueuePool}
+    for name, (option, type, default) in POOL_SETTINGS.items():
+        options[option] = _setting(config, name, type, default)
+
+    if backend == 'sqlite':
+        # pooled connections move between the threads serving requests
+        options['connect_args'] = {'check_same_thread': False}
+    statement_timeout = _setting(config, STATEMENT_TIMEOUT_SETTING, int, 0)
+    if statement_timeout and backend in ('postgres', 'postgresql'):
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(statement_timeout)}
+    return options
+
+
+class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
+    '''
+    Flask-SQLAlchemy with the pool configured by engine_options(), for
+    the database URI the engine is actually created for.
+    SQLALCHEMY_ENGINE_OPTIONS still takes precedence.
+    '''
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        options.update(engine_options(sa_url, app.config))
+
+
+class PoolMetrics:
+    '''
+    Counts of one pool's checkouts and a histogram of how long they took,
+    including any wait for a free connection. `waiting` is the number of
+    checkouts blocked right now because the pool is exhausted, `blocked`
+    how many checkouts had to wait since start-up.
+    '''
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.blocked = 0
+            self.waiting = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.bucket_counts = [0] * (len(self.buckets) + 1)
+
+    def start_wait(self):
+        with self._lock:
+            self.blocked += 1
+            self.waiting += 1
+
+    def end_wait(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def observe(self, seconds, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    break
+            else:
+                index = len(self.buckets)
+            self.bucket_counts[index] += 1
+
+    def snapshot(self):
+        '''
+        The checkout statistics as a dict ready for jsonify(). Histogram
+        buckets are cumulative.
+        '''
+        with self._lock:
+            cumulative, buckets = 0, []
+            for bound, count in zip(self.buckets + ('+Inf',),
+                                    self.bucket_counts):
+                cumulative += count
+                buckets.append({'le': bound, 'count': cumulative})
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'blocked': self.blocked,
+                'waiting': self.waiting,
+                'wait_seconds_total': self.wait_seconds,
+                'wait_seconds_max': self.max_wait_seconds,
+                'checkout_latency': buckets,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    '''
+    QueuePool that records every checkout in its own PoolMetrics, kept
+    when the engine recreates the pool, e.g. after a disconnect.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _will_block(self):
+        # No idle connection and no room to open another one. Racy, as
+        # the check is made before the checkout takes the pool's lock, so
+        # `waiting` can be off by the few checkouts of that instant.
+        return (self._pool.empty() and self._max_overflow > -1 and
+                self._overflow >= self._max_overflow)
+
+    def _do_get(self):
+        blocked = self._will_block()
+        if blocked:
+            self.metrics.start_wait()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.observe(time.perf_counter() - started, True)
+            raise
+        finally:
+            if blocked:
+                self.metrics.end_wait()
+        self.metrics.observe(time.perf_counter() - started)
+        return connection
+
+
+def pool_snapshot(pool):
+    '''
+    A pool's current state and, for an InstrumentedQueuePool, its checkout
+    statistics, as a dict ready for jsonify().
+    '''
+    metrics = getattr(pool, 'metrics', None)
+    snapshot = metrics.snapshot() if metrics else {}
+    snapshot['pool'] = type(pool).__name__
+    if isinstance(pool, QueuePool):
+        snapshot.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+        })
+    return snapshot
+
+
+def pools_snapshot(db, app=None):
+    '''
+    pool_snapshot() of the default engine of a Flask-SQLAlchemy db, with
+    those of its SQLALCHEMY_BINDS engines (e.g. read replicas) by bind key
+    under 'binds'.
+    '''
+    app = db.get_app(app)
+    snapshot = pool_snapshot(db.get_engine(app).pool)
+    snapshot['binds'] = {
+        key: pool_snapshot(db.get_engine(app, bind=key).pool)
+        for key in app.config.get('SQLALCHEMY_BINDS') or {}}
+    return snapshot
@@ -0,0 +1,232 @@
+import collections
+import os
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+
+from . import sql_events
+
+# Setting -> (type, default). Each setting is read from the app config,
+# then from the environment.
+QUERY_BUDGET_SETTINGS = {
+    # 'off', 'warn' to log requests over budget, 'fail' to raise
+    # QueryBudgetExceeded from them
+    'QUERY_BUDGET_MODE': (str, 'off'),
+    # Budget of the endpoints without @query_budget; 0 for none
+    'QUERY_BUDGET': (int, 0),
+}
+QUERY_BUDGET_MODES = ('off', 'warn', 'fail')
+# Longest statement text quoted in a report
+REPORT_STATEMENT_LENGTH = 200
+
+
+def _setting(config, name):
+    type, default = QUERY_BUDGET_SETTINGS[name]
+    value = config.get(name, os.environ.get(name))
+    if value is None or value == '':
+        return default
+    return type(value)
+
+
+class QueryBudgetExceeded(AssertionError):
+    '''
+    A request ran more SQL statements than its endpoint's budget.
+    '''
+
+
+class QueryLog:
+    '''
+    The SQL statements run in this thread while the log is active, by the
+    request each one ran for. Requests are numbered from 1 in the order
+    they ran their first statement; statements outside a request have
+    None for both number and endpoint.
+    '''
+
+    def __init__(self):
+        self.statements = []  # (request number, endpoint, statement)
+        self._request = None
+        self._requests = 0
+
+    def __len__(self):
+        return len(self.statements)
+
+    def record(self, statement):
+        number = endpoint = None
+        if has_request_context():
+            current = request._get_current_object()
+            if current is not self._request:
+                self._request = current
+                self._requests += 1
+            number, endpoint = self._requests, request.endpoint
+        self.statements.append((number, endpoint, statement))
+
+    def requests(self):
+        '''
+        (number, endpoint) of the requests that ran statements.
+        '''
+        return list(collections.OrderedDict(
+            (number, endpoint) for number, endpoint, _ in self.statements
+            if number is not None).items())
+
+    def _statements(self, number):
+        return [statement for n, _, statement in self.statements
+                if number is None or n == number]
+
+    def count(self, number=None):
+        return len(self._statements(number))
+
+    def repeated(self, number=None):
+        '''
+        (statement, times) of the statements run more than once, most
+        repeated first. The same statement text with different parameters,
+        run once per row of an earlier result, is the mark of an N+1.
+        '''
+        counts = collections.Counter(self._statements(number))
+        return [(statement, times) for statement, times in
+                counts.most_common() if times > 1]
+
+    def report(self, number=None, budget=None):
+        if number is None:
+            name = ', '.join(e for _, e in self.requests() if e)
+        else:
+            name = dict(self.requests()).get(number)
+        lines = ['{} ran {} SQL statements{}'.format(
+            name or 'block', self.count(number),
+            '' if budget is None else ', over its budget of {}'.format(
+                budget))]
+        for statement, times in self.repeated(number):
+            statement = ' '.join(statement.split())
+            if len(statement) > REPORT_STATEMENT_LENGTH:
+                statement = statement[:REPORT_STATEMENT_LENGTH] + '...'
+            lines.append('  {}x {}'.format(times, statement))
+        return '\n'.join(lines)
+
+
+_active = threading.local()
+
+
+def _logs():
+    if not hasattr(_active, 'logs'):
+        _active.logs = []
+    return _active.logs
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters,
+                           context, executemany):
+    logs = getattr(_active, 'logs', None)
+    if not logs:
+        return
+    for log in logs:
+        log.record(statement)
+
+
+sql_events.listen('before_cursor_execute', _before_cursor_execute)
+
+
+@contextmanager
+def count_queries():
+    '''
+    Yields a QueryLog of the SQL statements the block runs, e.g.
+
+        with count_queries() as log:
+            client.get('/questions')
+        print(log.report())
+    '''
+    log = QueryLog()
+    logs = _logs()
+    logs.append(log)
+    try:
+        yield log
+    finally:
+        logs.remove(log)
+
+
+def query_budget(max_queries):
+    '''
+    Decorator declaring how many SQL statements one request to a view may
+    run. Put it right under @app.route.
+    '''
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def endpoint_budget(app, endpoint):
+    '''
+    The @query_budget of endpoint, else the app's QUERY_BUDGET; None when
+    neither is set.
+    '''
+    budget = getattr(app.view_functions.get(endpoint), 'query_budget', None)
+    if budget is None:
+        budget = _setting(app.config, 'QUERY_BUDGET') or None
+    return budget
+
+
+def init_query_budget(app):
+    '''
+    Counts the SQL statements of each request when QUERY_BUDGET_MODE is
+    'warn' or 'fail', for development. A request over its endpoint's
+    budget is logged with its repeated statements, or, in 'fail' mode,
+    raises QueryBudgetExceeded.
+    Statements run while a streamed response is sent are not counted.
+    '''
+    mode = _setting(app.config, 'QUERY_BUDGET_MODE')
+    if mode not in QUERY_BUDGET_MODES:
+        raise ValueError('QUERY_BUDGET_MODE must be one of {}, not {!r}'
+                         .format(', '.join(QUERY_BUDGET_MODES), mode))
+    if mode == 'off':
+        return
+
+    @app.before_request
+    def start_query_log():
+        g.query_log = QueryLog()
+        _logs().append(g.query_log)
+
+    @app.after_request
+    def check_query_budget(response):
+        log = g.pop('query_log', None)
+        if log is None:
+            return response
+        _logs().remove(log)
+        budget = endpoint_budget(current_app, request.endpoint)
+        if budget is None or len(log) <= budget:
+            return response
+        message = log.report(budget=budget)
+        if mode == 'fail':
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def stop_query_log(error=None):
+        # after_request did not run, e.g. on an unhandled exception
+        log = g.pop('query_log', None)
+        if log is not None:
+            _logs().remove(log)
+
+
+class QueryBudgetTestMixin:
+    '''
+    unittest.TestCase mixin asserting the query budgets of the requests a
+    test makes through the Flask test client. Expects self.app.
+    '''
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries=None):
+        '''
+        Asserts each request made in the block stays within max_queries
+        SQL statements or, without it, its endpoint's budget. The failure
+        lists the statements that were repeated.
+        '''
+        with count_queries() as log:
+            yield log
+        for number, endpoint in log.requests():
+            budget = max_queries
+            if budget is None:
+                budget = endpoint_budget(self.app, endpoint)
+            if budget is None:
+                self.fail('{} has no query budget'.format(endpoint))
+            if log.count(number) > budget:
+                self.fail(log.report(number, budget))
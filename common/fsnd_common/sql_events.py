@@ -0,0 +1,34 @@
+'''
+The process's single SQLAlchemy Engine listener for each cursor event.
+The modules of this package add their hooks here rather than each
+registering its own listeners on every Engine.
+'''
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Event -> hooks called, in the order they were added, by its listener
+_hooks = {
+    'before_cursor_execute': [],
+    'after_cursor_execute': [],
+    'handle_error': [],
+}
+
+
+def listen(name, hook):
+    '''
+    Calls hook with the arguments of every Engine `name` event, once
+    however many times it is added.
+    '''
+    if hook not in _hooks[name]:
+        _hooks[name].append(hook)
+
+
+def _dispatcher(hooks):
+    def dispatch(*args):
+        for hook in hooks:
+            hook(*args)
+    return dispatch
+
+
+for _name, _event_hooks in _hooks.items():
+    event.listen(Engine, _name, _dispatcher(_event_hooks))
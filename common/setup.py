@@ -0,0 +1,11 @@
+from setuptools import setup
+
+setup(
+    name='fsnd-common',
+    version='0.1.0',
+    description='Connection pool, metrics and auth helpers shared by the '
+                'Flask projects of this repository',
+    packages=['fsnd_common'],
+    python_requires='>=3.7',
+    install_requires=['Flask'],
+)
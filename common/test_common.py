@@ -0,0 +1,320 @@
+import datetime
+import decimal
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine
+
+from fsnd_common.auth import JWKSCache, TokenCache
+from fsnd_common.instrumentation import init_metrics, timed
+from fsnd_common.json_backend import init_json
+from fsnd_common.pool import engine_options, pool_snapshot
+from fsnd_common.query_budget import count_queries
+
+
+class PoolTestCase(unittest.TestCase):
+    """Checkout metrics of fsnd_common.pool"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.engine = self.create_engine('pool.db', {
+            'DB_POOL_SIZE': 1, 'DB_MAX_OVERFLOW': 0, 'DB_POOL_TIMEOUT': 5})
+
+    def create_engine(self, name, config=None):
+        url = 'sqlite:///' + os.path.join(self.directory, name)
+        engine = create_engine(url, **engine_options(url, config))
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def test_free_checkouts_do_not_wait(self):
+        for _ in range(3):
+            with self.engine.connect():
+                pass
+
+        snapshot = pool_snapshot(self.engine.pool)
+        self.assertEqual(snapshot['checkouts'], 3)
+        self.assertEqual(snapshot['blocked'], 0)
+        self.assertEqual(snapshot['waiting'], 0)
+
+    def test_blocked_checkout_counted_as_waiting(self):
+        held = self.engine.connect()
+        waiter = threading.Thread(target=lambda: self.engine.connect().close())
+        waiter.start()
+        deadline = time.monotonic() + 5
+        while (self.engine.pool.metrics.waiting == 0 and
+               time.monotonic() < deadline):
+            time.sleep(0.01)
+
+        self.assertEqual(pool_snapshot(self.engine.pool)['waiting'], 1)
+        held.close()
+        waiter.join()
+        snapshot = pool_snapshot(self.engine.pool)
+        self.assertEqual(snapshot['waiting'], 0)
+        self.assertEqual(snapshot['blocked'], 1)
+        self.assertEqual(snapshot['checkouts'], 2)
+
+    def test_metrics_kept_per_pool(self):
+        with self.engine.connect():
+            pass
+        other = self.create_engine('other.db')
+
+        self.assertEqual(pool_snapshot(other.pool)['checkouts'], 0)
+        self.assertEqual(pool_snapshot(self.engine.pool)['checkouts'], 1)
+
+    def test_metrics_survive_recreate(self):
+        with self.engine.connect():
+            pass
+        self.engine.dispose()
+
+        self.assertEqual(pool_snapshot(self.engine.pool)['checkouts'], 1)
+
+
+class JSONBackendTestCase(unittest.TestCase):
+    """init_json() of fsnd_common.json_backend"""
+
+    def jsonify(self, backend, value):
+        app = Flask(__name__)
+        app.config['JSON_BACKEND'] = backend
+        init_json(app)
+        with app.app_context():
+            return jsonify(value).get_data(as_text=True)
+
+    def test_orjson_gives_same_json_as_stdlib(self):
+        value = {'id': 1, 'ids': [2, 3], 'text': 'Caf\u00e9', 'none': None}
+
+        self.assertEqual(json.loads(self.jsonify('orjson', value)),
+                         json.loads(self.jsonify('json', value)))
+
+    def test_dates_and_decimals(self):
+        value = {'date': datetime.date(2020, 5, 17),
+                 'price': decimal.Decimal('1.50')}
+
+        self.assertEqual(json.loads(self.jsonify('orjson', value)),
+                         {'date': '2020-05-17', 'price': '1.50'})
+
+    def test_integer_beyond_64_bits_falls_back(self):
+        self.assertEqual(json.loads(self.jsonify('orjson', [2 ** 70])),
+                         [2 ** 70])
+
+
+class MetricsTestCase(unittest.TestCase):
+    """init_metrics() of fsnd_common.instrumentation"""
+
+    def metrics(self, app):
+        with app.test_client() as client:
+            return client.get('/metrics')
+
+    def test_metrics_kept_per_app(self):
+        instrumented, plain = Flask('instrumented'), Flask('plain')
+        instrumented.config['METRICS_ENABLED'] = True
+        init_metrics(instrumented)
+        init_metrics(plain)
+
+        for app in (instrumented, plain):
+            with app.app_context(), timed('jwt_verify'):
+                pass
+
+        self.assertIn('operation_duration_seconds_count{operation='
+                      '"jwt_verify"} 1',
+                      self.metrics(instrumented).get_data(as_text=True))
+        self.assertNotIn('metrics', plain.extensions)
+        self.assertEqual(self.metrics(plain).status_code, 404)
+
+
+class SQLEventsTestCase(unittest.TestCase):
+    """The Engine listeners shared by metrics and query budgets"""
+
+    def test_one_listener_per_event(self):
+        engine = create_engine('sqlite://')
+
+        self.assertEqual(len(engine.dispatch.before_cursor_execute), 1)
+        self.assertEqual(len(engine.dispatch.after_cursor_execute), 1)
+
+    def test_statements_counted_once(self):
+        engine = create_engine('sqlite://')
+
+        with count_queries() as log:
+            engine.execute('SELECT 1')
+
+        self.assertEqual(log.count(), 1)
+
+
+def rsa_key(kid, **members):
+    key = {'kty': 'RSA', 'kid': kid, 'use': 'sig', 'n': 'modulus-' + kid,
+           'e': 'AQAB', 'alg': 'RS256'}
+    key.update(members)
+    return key
+
+
+class JWKSServer:
+    """Local stand-in for a /.well-known/jwks.json endpoint"""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps({'keys': server.keys}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}/.well-known/jwks.json'.format(
+            self.httpd.server_port)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+    """fsnd_common.auth.JWKSCache against a local JWKS endpoint"""
+
+    def setUp(self):
+        self.server = JWKSServer([rsa_key('k1')])
+        self.addCleanup(self.server.close)
+
+    def cache(self, ttl=60, min_refresh_interval=60):
+        return JWKSCache(self.server.url, ttl=ttl,
+                         min_refresh_interval=min_refresh_interval)
+
+    def test_keys_cached_until_ttl_expires(self):
+        cache = self.cache(ttl=0.2)
+
+        self.assertEqual(cache.get_key('k1')['n'], 'modulus-k1')
+        self.assertEqual(cache.get_key('k1')['n'], 'modulus-k1')
+        self.assertEqual(self.server.requests, 1)
+        time.sleep(0.3)
+        self.assertIsNotNone(cache.get_key('k1'))
+
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(cache.stats(), {
+            'hits': 1, 'misses': 2, 'refreshes': 2, 'keys': 1})
+
+    def test_first_fetch_not_counted_as_hit(self):
+        cache = self.cache()
+
+        cache.get_key('k1')
+
+        self.assertEqual(cache.stats()['hits'], 0)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_unknown_kid_forces_refresh(self):
+        cache = self.cache(min_refresh_interval=0)
+        cache.get_key('k1')
+        self.server.keys = [rsa_key('k1'), rsa_key('k2')]
+
+        self.assertEqual(cache.get_key('k2')['kid'], 'k2')
+        self.assertEqual(self.server.requests, 2)
+
+    def test_unknown_kid_refresh_rate_limited(self):
+        cache = self.cache(min_refresh_interval=0.2)
+        cache.get_key('k1')
+        time.sleep(0.3)
+
+        self.assertIsNone(cache.get_key('rotated'))
+        self.assertIsNone(cache.get_key('rotated'))
+        self.assertIsNone(cache.get_key('rotated'))
+
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(cache.stats()['refreshes'], 2)
+
+    def test_keys_other_than_rsa_signing_keys_skipped(self):
+        self.server.keys = [
+            rsa_key('k1'),
+            {'kty': 'EC', 'kid': 'ec', 'crv': 'P-256', 'x': 'x', 'y': 'y'},
+            rsa_key('encryption', use='enc'),
+            {'kty': 'RSA', 'kid': 'no-modulus', 'e': 'AQAB'},
+            {'kty': 'RSA', 'n': 'modulus', 'e': 'AQAB'},
+            {name: value for name, value in rsa_key('no-use').items()
+             if name != 'use'}]
+        cache = self.cache()
+
+        self.assertEqual(cache.get_key('k1'), {
+            'kty': 'RSA', 'kid': 'k1', 'use': 'sig', 'n': 'modulus-k1',
+            'e': 'AQAB'})
+        self.assertEqual(cache.get_key('no-use')['use'], 'sig')
+        self.assertIsNone(cache.get_key('ec'))
+        self.assertIsNone(cache.get_key('encryption'))
+        self.assertEqual(cache.stats()['keys'], 2)
+
+    def test_failed_refresh_keeps_keys(self):
+        cache = self.cache(ttl=0.2, min_refresh_interval=0)
+        cache.get_key('k1')
+        self.server.close()
+        time.sleep(0.3)
+
+        self.assertEqual(cache.get_key('k1')['kid'], 'k1')
+        self.assertEqual(cache.stats()['refreshes'], 1)
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """fsnd_common.auth.TokenCache"""
+
+    def payload(self, **claims):
+        payload = {'sub': 'user', 'exp': time.time() + 60,
+                   'permissions': ['get:drinks-detail']}
+        payload.update(claims)
+        return payload
+
+    def test_cached_payload_is_copied(self):
+        cache = TokenCache()
+        payload, permissions = cache.put('token', self.payload())
+        payload['permissions'].append('delete:drinks')
+
+        cached, permissions = cache.get('token')
+        cached['permissions'].append('patch:drinks')
+
+        self.assertEqual(cache.get('token')[0]['permissions'],
+                         ['get:drinks-detail'])
+        self.assertEqual(permissions, frozenset(['get:drinks-detail']))
+
+    def test_expired_token_not_served(self):
+        cache = TokenCache()
+        cache.put('token', self.payload(exp=time.time() - 1))
+
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_token_without_exp_not_cached(self):
+        cache = TokenCache()
+        payload = self.payload()
+        del payload['exp']
+        cache.put('token', payload)
+
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_least_recently_used_evicted(self):
+        cache = TokenCache(maxsize=2)
+        for token in ('a', 'b'):
+            cache.put(token, self.payload())
+        cache.get('a')
+        cache.put('c', self.payload())
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
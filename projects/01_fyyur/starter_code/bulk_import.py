@@ -0,0 +1,318 @@
+import csv
+import io
+import json
+import os
+import time
+from collections import namedtuple
+
+from sqlalchemy.exc import DBAPIError
+from werkzeug.datastructures import MultiDict
+
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show
+from page_cache import page_cache
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Rows inserted per statement (or COPY) and per transaction
+BATCH_SIZE = 1000
+
+# Model columns a file may set besides the ones on the form
+EXTRA_COLUMNS = {
+  Venue: ('website', 'seeking_talent', 'seeking_description'),
+  Artist: ('website', 'seeking_venue', 'seeking_description'),
+  Show: (),
+}
+
+IMPORTERS = {
+  'venues': (VenueForm, Venue),
+  'artists': (ArtistForm, Artist),
+  'shows': (ShowForm, Show),
+}
+
+ImportResult = namedtuple('ImportResult', 'imported rejected seconds rejects_path')
+
+
+class RowError(ValueError):
+  pass
+
+
+def import_file(kind, path, batch_size=BATCH_SIZE, rejects_path=None):
+  '''
+  Loads the venues, artists or shows of a CSV, JSON Lines or JSON file.
+
+  Rows are validated with the rules of the matching form and inserted in
+  batches; rows that fail either step are written, with an "error" column,
+  to rejects_path (by default next to the input, created only if needed).
+  A .json file must hold an array of objects; its rejects are written as
+  JSON Lines. Raises ValueError if it does not.
+  Shows refer to their venue and artist by venue_id/artist_id or by
+  venue_name/artist_name.
+  '''
+  form_class, model = IMPORTERS[kind]
+  table = model.__table__
+  format = _format(path)
+  jsonl = format != 'csv'
+  if rejects_path is None:
+    root, ext = os.path.splitext(path)
+    # rejected rows of a JSON array are written one per line
+    rejects_path = '{}.rejects{}'.format(root, '.jsonl' if format == 'json' else ext)
+
+  started = time.perf_counter()
+  imported = 0
+  rejects = _RejectWriter(rejects_path, jsonl)
+  form = form_class(formdata=None, meta={'csrf': False})
+  to_values = _show_values(_References(db.engine)) if model is Show else _values
+  columns = _columns(form, model)
+
+  try:
+    batch = []
+    for raw, row in _read(path, format):
+      try:
+        if row is None:
+          raise RowError('not a JSON object')
+        values = to_values(form, model, row)
+      except RowError as error:
+        rejects.write(raw, str(error))
+        continue
+      batch.append((raw, {column: values.get(column) for column in columns}))
+      if len(batch) >= batch_size:
+        imported += _insert_batch(table, columns, batch, rejects)
+        batch = []
+    if batch:
+      imported += _insert_batch(table, columns, batch, rejects)
+  finally:
+    rejects.close()
+    if imported:
+      # Core inserts bypass the session hooks that drop changed pages
+      page_cache.clear()
+
+  return ImportResult(imported, rejects.count, time.perf_counter() - started,
+                      rejects_path if rejects.count else None)
+
+
+#  Reading
+#  ----------------------------------------------------------------
+
+def _format(path):
+  ext = os.path.splitext(path)[1].lower()
+  if ext in ('.jsonl', '.ndjson'):
+    return 'jsonl'
+  if ext == '.json':
+    return 'json'
+  return 'csv'
+
+
+def _read(path, format):
+  # Yields (raw row, dict or None), streaming CSV and JSON Lines files; a
+  # JSON array has to be parsed whole
+  with open(path, newline='', encoding='utf-8') as f:
+    if format == 'csv':
+      for row in csv.DictReader(f):
+        yield row, row
+      return
+    if format == 'json':
+      try:
+        rows = json.load(f)
+      except ValueError as error:
+        raise ValueError('{} is not valid JSON: {}'.format(path, error))
+      if not isinstance(rows, list):
+        raise ValueError('{} does not hold a JSON array'.format(path))
+      for row in rows:
+        yield json.dumps(row), row if isinstance(row, dict) else None
+      return
+    for line in f:
+      line = line.strip()
+      if not line:
+        continue
+      try:
+        row = json.loads(line)
+      except ValueError:
+        yield line, None
+        continue
+      yield line, row if isinstance(row, dict) else None
+
+
+class _RejectWriter:
+  # Writes rejected rows in the input's format, opening the file lazily
+
+  def __init__(self, path, jsonl):
+    self.path = path
+    self.jsonl = jsonl
+    self.count = 0
+    self._file = None
+    self._csv = None
+
+  def write(self, raw, error):
+    if self._file is None:
+      self._file = open(self.path, 'w', newline='', encoding='utf-8')
+    self.count += 1
+    if self.jsonl:
+      try:
+        row = json.loads(raw)
+      except ValueError:
+        row = None
+      if not isinstance(row, dict):
+        row = {'line': raw}
+      row['error'] = error
+      self._file.write(json.dumps(row, default=str) + '\n')
+      return
+    if self._csv is None:
+      fields = [key for key in raw if key is not None] + ['error']
+      self._csv = csv.DictWriter(self._file, fields, extrasaction='ignore')
+      self._csv.writeheader()
+    self._csv.writerow(dict(raw, error=error))
+
+  def close(self):
+    if self._file is not None:
+      self._file.close()
+
+
+#  Validation
+#  ----------------------------------------------------------------
+
+def _columns(form, model):
+  names = set(model.__table__.columns.keys())
+  return [name for name in form.data if name in names] + list(EXTRA_COLUMNS[model])
+
+
+def _formdata(row):
+  formdata = MultiDict()
+  for key, value in row.items():
+    if value is None or key is None:
+      continue
+    if isinstance(value, list):
+      values = value
+    elif key == 'genres':
+      values = str(value).split(',')
+    else:
+      values = [value]
+    for value in values:
+      formdata.add(key, str(value).strip())
+  return formdata
+
+
+def _parse_bool(value):
+  if isinstance(value, bool) or value is None:
+    return bool(value)
+  value = str(value).strip().lower()
+  if value in ('', '0', 'f', 'false', 'n', 'no'):
+    return False
+  if value in ('1', 't', 'true', 'y', 'yes'):
+    return True
+  raise RowError('not a boolean: {!r}'.format(value))
+
+
+def _values(form, model, row):
+  # The form is reused from row to row: processing new data resets it
+  form.process(_formdata(row))
+  if not form.validate():
+    raise RowError('; '.join('{}: {}'.format(name, ' '.join(errors))
+                             for name, errors in sorted(form.errors.items())))
+  values = {name: value or None for name, value in form.data.items()}
+  if values.get('genres'):
+    values['genres'] = ','.join(values['genres'])
+  for name in EXTRA_COLUMNS[model]:
+    value = row.get(name)
+    if name.startswith('seeking_') and name != 'seeking_description':
+      values[name] = _parse_bool(value)
+    elif value is not None:
+      values[name] = str(value).strip() or None
+    else:
+      values[name] = None
+  return values
+
+
+class _References:
+  # Venue and artist ids, and ids by case-folded name, read once per import
+
+  def __init__(self, engine):
+    self.ids = {}
+    self.names = {}
+    with engine.connect() as connection:
+      for model in (Venue, Artist):
+        ids = self.ids[model] = set()
+        names = self.names[model] = {}
+        for id, name in connection.execute(db.select([model.id, model.name])):
+          ids.add(id)
+          key = (name or '').casefold()
+          # a name shared by several rows cannot identify one of them
+          names[key] = None if key in names else id
+
+  def resolve(self, model, row, prefix):
+    value = row.get(prefix + '_id')
+    if value not in (None, ''):
+      try:
+        id = int(value)
+      except (TypeError, ValueError):
+        raise RowError('{}_id: not an integer'.format(prefix))
+      if id not in self.ids[model]:
+        raise RowError('{}_id: no {} {}'.format(prefix, prefix, id))
+      return id
+
+    name = row.get(prefix + '_name')
+    if not name:
+      raise RowError('{0}_id or {0}_name is required'.format(prefix))
+    key = str(name).strip().casefold()
+    if key not in self.names[model]:
+      raise RowError('{}_name: no {} named {!r}'.format(prefix, prefix, name))
+    if self.names[model][key] is None:
+      raise RowError('{}_name: several {}s named {!r}'.format(prefix, prefix, name))
+    return self.names[model][key]
+
+
+def _show_values(references):
+  def to_values(form, model, row):
+    values = _values(form, model, row)
+    values['venue_id'] = references.resolve(Venue, row, 'venue')
+    values['artist_id'] = references.resolve(Artist, row, 'artist')
+    return values
+  return to_values
+
+
+#  Writing
+#  ----------------------------------------------------------------
+
+def _insert_batch(table, columns, batch, rejects):
+  # One transaction per batch. If the batch fails, its rows are retried one
+  # at a time so only the offending rows are rejected.
+  rows = [values for _, values in batch]
+  try:
+    with db.engine.begin() as connection:
+      _insert(connection, table, columns, rows)
+    return len(rows)
+  except DBAPIError:
+    pass
+
+  imported = 0
+  for raw, values in batch:
+    try:
+      with db.engine.begin() as connection:
+        connection.execute(table.insert(), [values])
+      imported += 1
+    except DBAPIError as error:
+      rejects.write(raw, str(error.orig).strip())
+  return imported
+
+
+def _insert(connection, table, columns, rows):
+  if connection.dialect.name != 'postgresql':
+    # executemany: one prepared INSERT run over every row of the batch
+    connection.execute(table.insert(), rows)
+    return
+
+  # COPY streams the whole batch to the server in a single round trip
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  for row in rows:
+    # empty unquoted fields are read back as NULL
+    writer.writerow(['' if row[column] is None else row[column] for column in columns])
+  buffer.seek(0)
+  cursor = connection.connection.cursor()
+  try:
+    cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+      table.name, ', '.join('"{}"'.format(column) for column in columns)), buffer)
+  finally:
+    cursor.close()
@@ -11,3 +11,17 @@ DEBUG = True
 
 # TODO IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = '<Put your local database url>'
+
+# Connection pool (see fsnd_common/pool.py). DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+# DB_POOL_RECYCLE, DB_POOL_PRE_PING and DB_STATEMENT_TIMEOUT can be set here
+# or in the environment; settings here win. GET /pool/metrics is only served to
+# requests with an `Authorization: Bearer <MONITORING_TOKEN>` header, and to none
+# while MONITORING_TOKEN is unset here and in the environment.
+
+# Request metrics (see fsnd_common/instrumentation.py): set METRICS_ENABLED here or in the
+# environment to serve GET /metrics. METRICS_PROFILE_RATE, METRICS_SLOW_REQUEST,
+# METRICS_PROFILE_DIR and METRICS_PROFILE_KEEP control the slow request profiles.
+
+# Query budgets (see fsnd_common/query_budget.py): QUERY_BUDGET_MODE = 'warn' logs, and 'fail'
+# raises on, requests running more SQL statements than their @query_budget.
+
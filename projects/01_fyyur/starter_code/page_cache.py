@@ -0,0 +1,169 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Rendered pages kept in memory
+PAGE_CACHE_SIZE = 512
+# Seconds a page is kept even without writes: shows move from upcoming to
+# past as time goes by, and writes made by other processes go unseen
+PAGE_CACHE_TTL = 60
+
+
+class PageCache:
+  '''
+  LRU cache of rendered HTML pages keyed by entity ('venue:1', 'venues'...).
+
+  Entries are dropped by the write paths that change them (see the session
+  hooks below, and bulk_import), and after PAGE_CACHE_TTL seconds in any
+  case. Each entry keeps a strong ETag of its body so repeat visits can
+  get a 304.
+
+  The cache lives in one process: a write made by another server worker
+  or by `flask import` in a shell only shows once PAGE_CACHE_TTL has
+  passed.
+  '''
+
+  def __init__(self, maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    '''Returns (body, etag) for a cached page, or None.'''
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None or time.monotonic() >= entry[2]:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[0], entry[1]
+
+  def set(self, key, body):
+    '''Caches a rendered page and returns its ETag.'''
+    etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+    with self._lock:
+      self._entries[key] = (body, etag, time.monotonic() + self.ttl)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+    return etag
+
+  def invalidate(self, keys):
+    with self._lock:
+      for key in keys:
+        if self._entries.pop(key, None) is not None:
+          self.invalidations += 1
+
+  def clear(self):
+    with self._lock:
+      self.invalidations += len(self._entries)
+      self._entries.clear()
+
+  def stats(self):
+    lookups = self.hits + self.misses
+    return {
+      'hits': self.hits,
+      'misses': self.misses,
+      'evictions': self.evictions,
+      'invalidations': self.invalidations,
+      'size': len(self._entries),
+      'maxsize': self.maxsize,
+      'hit_rate': self.hits / lookups if lookups else 0.0,
+    }
+
+
+page_cache = PageCache()
+
+
+def cached_page(key):
+  '''
+  Caches the HTML a view renders under key, formatted with the view's
+  arguments (e.g. 'venue:{venue_id}'), and answers If-None-Match with 304.
+  '''
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      # Pages showing flashed messages are meant for one visitor only
+      if '_flashes' in session:
+        return view(**kwargs)
+
+      cache_key = key.format(**kwargs)
+      entry = page_cache.get(cache_key)
+      if entry is None:
+        body = view(**kwargs)
+        entry = body, page_cache.set(cache_key, body)
+
+      response = make_response(entry[0])
+      response.set_etag(entry[1])
+      return response.make_conditional(request)
+    return wrapper
+  return decorator
+
+
+#  Invalidation
+#  ----------------------------------------------------------------
+#  Keys are collected as the session flushes and dropped once it commits.
+
+def _related_keys(connection, column, value, prefix, target):
+  rows = connection.execute(
+    db.select([target]).where(column == value).distinct())
+  return {'{}:{}'.format(prefix, row[0]) for row in rows}
+
+
+def _changed_value(obj, attribute):
+  history = db.inspect(obj).attrs[attribute].history
+  return set(history.added or ()) | set(history.deleted or ()) | set(history.unchanged or ())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_page_keys(session, flush_context):
+  keys = session.info.setdefault('page_cache_keys', set())
+  connection = session.connection()
+  # a venue or artist is only dirty from gaining a show, which the Show covers
+  dirty = [obj for obj in session.dirty
+           if session.is_modified(obj, include_collections=False)]
+  for obj in list(session.new) + dirty + list(session.deleted):
+    if isinstance(obj, Show):
+      keys.add('venues')
+      keys.update('venue:{}'.format(v) for v in _changed_value(obj, 'venue_id'))
+      keys.update('artist:{}'.format(a) for a in _changed_value(obj, 'artist_id'))
+    elif isinstance(obj, Venue):
+      keys.update(('venues', 'venue:{}'.format(obj.id)))
+      # artist pages show the names and images of their venues
+      keys.update(_related_keys(
+        connection, Show.venue_id, obj.id, 'artist', Show.artist_id))
+    elif isinstance(obj, Artist):
+      keys.update(('artists', 'artist:{}'.format(obj.id)))
+      keys.update(_related_keys(
+        connection, Show.artist_id, obj.id, 'venue', Show.venue_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_pages(session):
+  keys = session.info.pop('page_cache_keys', None)
+  if keys:
+    page_cache.invalidate(keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_page_keys(session):
+  session.info.pop('page_cache_keys', None)
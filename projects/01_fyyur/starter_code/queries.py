@@ -0,0 +1,216 @@
+from datetime import datetime
+from itertools import groupby
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# Rows fetched per round trip when streaming large listings
+STREAM_BATCH_SIZE = 1000
+# Shows on one page of the /shows listing
+SHOWS_PER_PAGE = 60
+
+
+def venue_areas(now=None):
+  '''
+  Venues grouped by (city, state), each with its number of upcoming shows.
+
+  The whole structure comes from one aggregated query (a LEFT JOIN on the
+  upcoming shows with a GROUP BY venue), read in batches and grouped as it
+  streams, so the query count does not depend on the number of venues.
+  '''
+  now = now or datetime.now()
+  num_upcoming_shows = db.func.count(Show.id)
+  rows = db.session.query(
+      Venue.city, Venue.state, Venue.id, Venue.name, num_upcoming_shows
+    ).outerjoin(
+      Show, db.and_(Show.venue_id == Venue.id, Show.start_time > now)
+    ).group_by(
+      Venue.state, Venue.city, Venue.id, Venue.name
+    ).order_by(
+      Venue.state, Venue.city, Venue.name, Venue.id
+    ).yield_per(STREAM_BATCH_SIZE)
+
+  for (city, state), area in groupby(rows, key=lambda row: (row[0], row[1])):
+    yield {
+      'city': city,
+      'state': state,
+      'venues': [{
+        'id': venue_id,
+        'name': name,
+        'num_upcoming_shows': count,
+      } for _, _, venue_id, name, count in area]
+    }
+
+
+def _split_shows(rows, keys):
+  '''
+  Splits (id, name, image_link, start_time, is_upcoming) show rows into
+  past and upcoming lists of dicts using the given key names.
+  '''
+  past_shows, upcoming_shows = [], []
+  for row in rows:
+    show = dict(zip(keys, row[:3]))
+    show['start_time'] = row[3]
+    (upcoming_shows if row[4] else past_shows).append(show)
+  return past_shows, upcoming_shows
+
+
+def _show_columns(rows):
+  '''
+  The show columns of (entity, *show columns) detail rows, skipping the
+  NULL row an outer join returns for an entity without shows.
+  '''
+  return (row[1:] for row in rows if row[4] is not None)
+
+
+def _genres(genres):
+  return [genre for genre in (genres or '').split(',') if genre]
+
+
+def venue_detail(venue_id, now=None):
+  '''
+  Data for the venue page, or None if there is no such venue.
+
+  Takes one query whatever the number of shows: the venue LEFT JOINed to
+  its shows and their artist, with the past/upcoming flag computed in SQL.
+  A venue without shows comes back as a single row with NULL show columns.
+  '''
+  now = now or datetime.now()
+  rows = db.session.query(
+      Venue, Show.artist_id, Artist.name, Artist.image_link, Show.start_time,
+      Show.start_time > now
+    ).outerjoin(Show, Show.venue_id == Venue.id
+    ).outerjoin(Artist, Artist.id == Show.artist_id
+    ).filter(Venue.id == venue_id
+    ).order_by(Show.start_time).all()
+  if not rows:
+    return None
+
+  venue = rows[0][0]
+  past_shows, upcoming_shows = _split_shows(
+    _show_columns(rows), ('artist_id', 'artist_name', 'artist_image_link'))
+
+  return {
+    'id': venue.id,
+    'name': venue.name,
+    'genres': _genres(venue.genres),
+    'address': venue.address,
+    'city': venue.city,
+    'state': venue.state,
+    'phone': venue.phone,
+    'website': venue.website,
+    'facebook_link': venue.facebook_link,
+    'seeking_talent': venue.seeking_talent,
+    'seeking_description': venue.seeking_description,
+    'image_link': venue.image_link,
+    'past_shows': past_shows,
+    'upcoming_shows': upcoming_shows,
+    'past_shows_count': len(past_shows),
+    'upcoming_shows_count': len(upcoming_shows),
+  }
+
+
+def artist_detail(artist_id, now=None):
+  '''
+  Data for the artist page, or None if there is no such artist.
+
+  Takes one query whatever the number of shows: the artist LEFT JOINed to
+  its shows and their venue, with the past/upcoming flag computed in SQL.
+  An artist without shows comes back as a single row with NULL show columns.
+  '''
+  now = now or datetime.now()
+  rows = db.session.query(
+      Artist, Show.venue_id, Venue.name, Venue.image_link, Show.start_time,
+      Show.start_time > now
+    ).outerjoin(Show, Show.artist_id == Artist.id
+    ).outerjoin(Venue, Venue.id == Show.venue_id
+    ).filter(Artist.id == artist_id
+    ).order_by(Show.start_time).all()
+  if not rows:
+    return None
+
+  artist = rows[0][0]
+  past_shows, upcoming_shows = _split_shows(
+    _show_columns(rows), ('venue_id', 'venue_name', 'venue_image_link'))
+
+  return {
+    'id': artist.id,
+    'name': artist.name,
+    'genres': _genres(artist.genres),
+    'city': artist.city,
+    'state': artist.state,
+    'phone': artist.phone,
+    'website': artist.website,
+    'facebook_link': artist.facebook_link,
+    'seeking_venue': artist.seeking_venue,
+    'seeking_description': artist.seeking_description,
+    'image_link': artist.image_link,
+    'past_shows': past_shows,
+    'upcoming_shows': upcoming_shows,
+    'past_shows_count': len(past_shows),
+    'upcoming_shows_count': len(upcoming_shows),
+  }
+
+
+def encode_show_cursor(start_time, show_id):
+  return '{}_{}'.format(start_time.isoformat(), show_id)
+
+
+def decode_show_cursor(cursor):
+  '''
+  Parses a cursor made by encode_show_cursor; raises ValueError if invalid.
+  '''
+  start_time, show_id = cursor.rsplit('_', 1)
+  return datetime.fromisoformat(start_time), int(show_id)
+
+
+def show_page(after=None, limit=SHOWS_PER_PAGE):
+  '''
+  One page of the shows listing, ordered by (start_time, id), and the
+  cursor of the next page (None on the last page).
+
+  after is a (start_time, id) pair: pages are read by keyset, so a deep
+  page costs the same as the first, and the venue and artist columns come
+  from one joined query per page.
+  '''
+  query = db.session.query(
+      Show.id, Show.venue_id, Venue.name, Show.artist_id, Artist.name,
+      Artist.image_link, Show.start_time
+    ).join(Venue, Venue.id == Show.venue_id
+    ).join(Artist, Artist.id == Show.artist_id)
+  if after is not None:
+    query = query.filter(db.tuple_(Show.start_time, Show.id) > after)
+  rows = query.order_by(Show.start_time, Show.id).limit(limit + 1).all()
+
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = encode_show_cursor(rows[-1][6], rows[-1][0])
+
+  shows = [{
+    'venue_id': venue_id,
+    'venue_name': venue_name,
+    'artist_id': artist_id,
+    'artist_name': artist_name,
+    'artist_image_link': artist_image_link,
+    'start_time': start_time,
+  } for _, venue_id, venue_name, artist_id, artist_name, artist_image_link,
+      start_time in rows]
+  return shows, next_cursor
+
+
+def iter_shows(page_size=STREAM_BATCH_SIZE):
+  '''
+  Every show in listing order, read one keyset page at a time so only one
+  page is held in memory.
+  '''
+  after = None
+  while True:
+    shows, cursor = show_page(after, page_size)
+    yield from shows
+    if cursor is None:
+      return
+    after = decode_show_cursor(cursor)
@@ -0,0 +1,164 @@
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Results shown per page of a venue or artist search
+SEARCH_RESULTS_PER_PAGE = 20
+# Shortest term the trigram indexes can look up
+MIN_INDEXED_TERM_LENGTH = 3
+
+# PostgreSQL: a trigram GIN index lets ILIKE '%term%' use an index scan.
+POSTGRES_INDEX = [
+  'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+  'CREATE INDEX IF NOT EXISTS "ix_{table}_name_trgm" '
+  'ON "{table}" USING gin (name gin_trgm_ops)',
+]
+
+# SQLite: an FTS5 table with the trigram tokenizer, kept in sync with the
+# table by triggers, gives the same case-insensitive substring matching.
+SQLITE_INDEX = [
+  'CREATE VIRTUAL TABLE "{table}_fts" USING fts5('
+  'name, content=\'{table}\', content_rowid=\'id\', tokenize=\'trigram\')',
+  'CREATE TRIGGER "{table}_fts_insert" AFTER INSERT ON "{table}" BEGIN '
+  'INSERT INTO "{table}_fts"(rowid, name) VALUES (new.id, new.name); END',
+  'CREATE TRIGGER "{table}_fts_delete" AFTER DELETE ON "{table}" BEGIN '
+  'INSERT INTO "{table}_fts"("{table}_fts", rowid, name) '
+  'VALUES (\'delete\', old.id, old.name); END',
+  'CREATE TRIGGER "{table}_fts_update" AFTER UPDATE OF name ON "{table}" BEGIN '
+  'INSERT INTO "{table}_fts"("{table}_fts", rowid, name) '
+  'VALUES (\'delete\', old.id, old.name); '
+  'INSERT INTO "{table}_fts"(rowid, name) VALUES (new.id, new.name); END',
+  'INSERT INTO "{table}_fts"("{table}_fts") VALUES (\'rebuild\')',
+]
+
+# Searchable models and the Show column that refers to them
+SEARCHABLE = {
+  Venue: Show.venue_id,
+  Artist: Show.artist_id,
+}
+
+# SQLite tables known to have their FTS table, to skip the lookup per search
+_fts_tables = set()
+
+
+def create_search_index(connection, tables=None):
+  '''
+  Creates the name search index of each searchable table if it is missing.
+
+  When it cannot be created (no permission to install pg_trgm, SQLite older
+  than 3.34) search still works, with a sequential scan.
+  '''
+  tables = tables or [model.__tablename__ for model in SEARCHABLE]
+  dialect = connection.dialect.name
+  for table in tables:
+    if dialect == 'postgresql':
+      statements = POSTGRES_INDEX
+    elif dialect == 'sqlite' and not _has_sqlite_index(connection, table):
+      statements = SQLITE_INDEX
+    else:
+      continue
+    try:
+      if dialect == 'postgresql':
+        # keep a failure from aborting the caller's transaction
+        with connection.begin_nested():
+          _execute(connection, statements, table)
+      else:
+        _execute(connection, statements, table)
+        _fts_tables.add(table)
+    except DBAPIError:
+      pass
+
+
+def _execute(connection, statements, table):
+  for statement in statements:
+    connection.execute(db.text(statement.format(table=table)))
+
+
+def _has_sqlite_index(connection, table):
+  if table not in _fts_tables and connection.execute(db.text(
+      'SELECT 1 FROM sqlite_master WHERE name = :name'
+    ), {'name': table + '_fts'}).scalar() is not None:
+    _fts_tables.add(table)
+  return table in _fts_tables
+
+
+def _on_create(target, connection, **kw):
+  create_search_index(connection, [target.name])
+
+
+def _on_drop(target, connection, **kw):
+  if connection.dialect.name == 'sqlite':
+    _fts_tables.discard(target.name)
+    connection.execute(db.text('DROP TABLE IF EXISTS "{}_fts"'.format(target.name)))
+
+
+for model in SEARCHABLE:
+  event.listen(model.__table__, 'after_create', _on_create)
+  event.listen(model.__table__, 'before_drop', _on_drop)
+
+
+def _search(model, term, page, per_page, now):
+  table = model.__tablename__
+  if (db.engine.dialect.name == 'sqlite' and
+      len(term) >= MIN_INDEXED_TERM_LENGTH and
+      _has_sqlite_index(db.session, table)):
+    matches = model.id.in_(db.text(
+      'SELECT rowid FROM "{0}_fts" WHERE "{0}_fts" MATCH :match'.format(table)
+    ).bindparams(match='"{}"'.format(term.replace('"', '""'))
+    ).columns(db.column('rowid')))
+  else:
+    pattern = '%{}%'.format(
+      term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+    matches = model.name.ilike(pattern, escape='\\')
+
+  # One aggregated query: matching rows, their upcoming show counts and,
+  # through a window over the grouped rows, the total number of matches.
+  show_key = SEARCHABLE[model]
+  rows = db.session.query(
+      model.id, model.name, db.func.count(Show.id), db.func.count().over()
+    ).outerjoin(
+      Show, db.and_(show_key == model.id, Show.start_time > now)
+    ).filter(matches
+    ).group_by(model.id, model.name
+    ).order_by(model.name, model.id
+    ).limit(per_page).offset((page - 1) * per_page).all()
+
+  if rows:
+    count = rows[0][3]
+  elif page > 1:
+    # Past the last page the window has no row to report the total on
+    count = db.session.query(db.func.count(model.id)).filter(matches).scalar()
+  else:
+    count = 0
+
+  return {
+    'count': count,
+    'data': [{
+      'id': id,
+      'name': name,
+      'num_upcoming_shows': num_upcoming_shows,
+    } for id, name, num_upcoming_shows, _ in rows]
+  }
+
+
+def search_venues(term, page=1, per_page=SEARCH_RESULTS_PER_PAGE, now=None):
+  '''
+  Venues whose name contains term, case-insensitive, each with its number
+  of upcoming shows, in the {'count', 'data'} shape of the results page.
+  '''
+  return _search(Venue, term, max(page, 1), per_page, now or datetime.now())
+
+
+def search_artists(term, page=1, per_page=SEARCH_RESULTS_PER_PAGE, now=None):
+  '''
+  Artists whose name contains term, case-insensitive, each with its number
+  of upcoming shows, in the {'count', 'data'} shape of the results page.
+  '''
+  return _search(Artist, term, max(page, 1), per_page, now or datetime.now())
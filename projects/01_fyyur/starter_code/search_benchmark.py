@@ -0,0 +1,86 @@
+'''
+Benchmark of the artist name search: search.search_artists(), one query
+for a page of results with their num_upcoming_shows and the match count,
+against an ILIKE loading every match plus one count of upcoming shows per
+artist on the page. Reports the mean of --repeat searches for each of
+--terms, over --artists artists with --shows shows.
+
+  python search_benchmark.py --artists 100000 --shows 200000
+
+The rows are written to a temporary SQLite file.
+'''
+import argparse
+import shutil
+import time
+from datetime import datetime
+
+from app import app
+from models import db, Artist, Show
+import search
+from venues_benchmark import seed, temporary_database
+
+# A term matching every artist, one matching a few, and one matching none
+TERMS = ['band', 'Artist 4242', 'zzzz']
+
+
+def ilike_search(term, now):
+  artists = Artist.query.filter(Artist.name.ilike('%{}%'.format(term))).all()
+  return {
+    'count': len(artists),
+    'data': [{
+      'id': artist.id,
+      'name': artist.name,
+      'num_upcoming_shows': Show.query.filter(
+        Show.artist_id == artist.id, Show.start_time > now).count(),
+    } for artist in artists[:search.SEARCH_RESULTS_PER_PAGE]]
+  }
+
+
+def mean(function, repeat):
+  '''Mean time of repeat calls, in seconds, and the last result'''
+  function()
+  started = time.perf_counter()
+  for _ in range(repeat):
+    result = function()
+    db.session.remove()
+  return result, (time.perf_counter() - started) / repeat
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--venues', type=int, default=100)
+  parser.add_argument('--artists', type=int, default=100000)
+  parser.add_argument('--shows', type=int, default=200000)
+  parser.add_argument('--terms', nargs='+', default=TERMS)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  directory = temporary_database('search.db')
+  results = []
+  try:
+    with app.app_context():
+      seed(args.venues, args.artists, args.shows)
+      now = datetime.now()
+      for term in args.terms:
+        indexed, indexed_seconds = mean(
+          lambda: search.search_artists(term, now=now), args.repeat)
+        scanned, scan_seconds = mean(
+          lambda: ilike_search(term, now), args.repeat)
+        assert indexed['count'] == scanned['count'], term
+        results.append((term, indexed['count'], scan_seconds,
+                        indexed_seconds))
+      db.engine.dispose()
+  finally:
+    shutil.rmtree(directory)
+
+  print('{} artists, {} shows, mean of {}'.format(
+    args.artists, args.shows, args.repeat))
+  print('  {:15} {:>8} {:>18} {:>18}'.format(
+    'term', 'matches', 'ILIKE + counts', 'search_artists()'))
+  for term, count, scan, indexed in results:
+    print('  {:15} {:8d} {:15.1f} ms {:15.1f} ms'.format(
+      repr(term), count, scan * 1000, indexed * 1000))
+
+
+if __name__ == '__main__':
+  main()
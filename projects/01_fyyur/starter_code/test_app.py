@@ -0,0 +1,377 @@
+import html
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from app import app
+from models import db, Venue, Artist, Show
+from queries import show_page, decode_show_cursor
+import search
+from page_cache import page_cache
+from fsnd_common.query_budget import QueryBudgetTestMixin, count_queries
+
+
+class FyyurTestCase(QueryBudgetTestMixin, unittest.TestCase):
+  """This class represents the fyyur test case"""
+
+  def setUp(self):
+    """Define test variables and initialize app."""
+    self.database_name = "fyyur_test"
+    self.database_path = "postgresql://{}/{}".format(
+        'localhost:5432', self.database_name)
+    app.config['SQLALCHEMY_DATABASE_URI'] = self.database_path
+    app.config['WTF_CSRF_ENABLED'] = False
+    self.app = app
+    self.client = self.app.test_client
+
+    with self.app.app_context():
+      db.drop_all()
+      db.create_all()
+
+      venue = Venue(name='The Musical Hop', city='San Francisco',
+                    state='CA', genres='Jazz,Folk')
+      artist = Artist(name='Guns N Petals', city='San Francisco',
+                      state='CA', genres='Rock n Roll')
+      db.session.add_all([venue, artist])
+      db.session.flush()
+
+      now = datetime.now()
+      db.session.add_all([
+          Show(venue_id=venue.id, artist_id=artist.id,
+               start_time=now + timedelta(days=days))
+          for days in (-30, -7, 7, 14, 30)])
+      db.session.commit()
+      page_cache.clear()
+      self.venue_id = venue.id
+      self.artist_id = artist.id
+
+  def tearDown(self):
+    """Executed after reach test"""
+    with self.app.app_context():
+      db.session.remove()
+      db.drop_all()
+
+  @contextmanager
+  def assertQueryCount(self, expected):
+    """Asserts that the block runs exactly `expected` SQL statements"""
+    with count_queries() as log:
+      yield log
+    self.assertEqual(log.count(), expected, log.report())
+
+  def test_venues_listing_is_one_query(self):
+    with self.assertQueryCount(1):
+      res = self.client().get('/venues')
+
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'The Musical Hop', res.data)
+
+  def test_show_venue_splits_past_and_upcoming(self):
+    with self.assertQueryCount(1):
+      res = self.client().get('/venues/{}'.format(self.venue_id))
+
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'3 Upcoming Shows', res.data)
+    self.assertIn(b'2 Past Shows', res.data)
+    self.assertIn(b'Guns N Petals', res.data)
+
+  def test_show_artist_splits_past_and_upcoming(self):
+    with self.assertQueryCount(1):
+      res = self.client().get('/artists/{}'.format(self.artist_id))
+
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'3 Upcoming Shows', res.data)
+    self.assertIn(b'2 Past Shows', res.data)
+    self.assertIn(b'The Musical Hop', res.data)
+
+  def test_detail_query_count_does_not_grow_with_shows(self):
+    with self.app.app_context():
+      db.session.add_all([
+          Show(venue_id=self.venue_id, artist_id=self.artist_id,
+               start_time=datetime.now() + timedelta(hours=hours))
+          for hours in range(1, 51)])
+      db.session.commit()
+
+    with self.assertQueryCount(1):
+      res = self.client().get('/venues/{}'.format(self.venue_id))
+    self.assertIn(b'53 Upcoming Shows', res.data)
+
+  def test_detail_without_shows(self):
+    with self.app.app_context():
+      venue = Venue(name='Park Square Live Music', city='San Francisco',
+                    state='CA')
+      artist = Artist(name='Matt Quevedo', city='New York', state='NY')
+      db.session.add_all([venue, artist])
+      db.session.commit()
+      paths = ['/venues/{}'.format(venue.id), '/artists/{}'.format(artist.id)]
+
+    for path in paths:
+      with self.assertQueryCount(1):
+        res = self.client().get(path)
+      self.assertEqual(res.status_code, 200)
+      self.assertIn(b'0 Upcoming Shows', res.data)
+      self.assertIn(b'0 Past Shows', res.data)
+
+  def test_404_missing_venue_and_artist(self):
+    for path in ('/venues/1000', '/artists/1000'):
+      with self.assertQueryCount(1):
+        res = self.client().get(path)
+      self.assertEqual(res.status_code, 404)
+
+  def test_pages_within_query_budget(self):
+    page_cache.clear()
+    with self.assertQueryBudget():
+      for path in ('/venues', '/venues/{}'.format(self.venue_id),
+                   '/artists/{}'.format(self.artist_id), '/shows'):
+        res = self.client().get(path)
+        self.assertEqual(res.status_code, 200)
+      res = self.client().post('/artists/search',
+                               data={'search_term': 'petal'})
+      self.assertEqual(res.status_code, 200)
+
+  def test_shows_listing_is_one_query_per_page(self):
+    with self.assertQueryCount(1):
+      res = self.client().get('/shows')
+
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res.data.count(b'tile-show'), 5)
+
+  def test_shows_listing_pages_by_cursor(self):
+    with self.app.app_context():
+      first_page, cursor = show_page(limit=3)
+      last_page, last_cursor = show_page(
+          decode_show_cursor(cursor), limit=3)
+
+    self.assertEqual(len(first_page), 3)
+    self.assertEqual(len(last_page), 2)
+    self.assertIsNone(last_cursor)
+    self.assertLess(first_page[-1]['start_time'],
+                    last_page[0]['start_time'])
+
+  def test_shows_listing_streamed(self):
+    res = self.client().get('/shows?stream=1')
+
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res.data.count(b'tile-show'), 5)
+
+  def test_400_shows_invalid_cursor(self):
+    res = self.client().get('/shows?after=yesterday')
+
+    self.assertEqual(res.status_code, 400)
+
+  def test_search_venues_is_one_query(self):
+    with self.assertQueryCount(1):
+      res = self.client().post('/venues/search',
+                               data={'search_term': 'hop'})
+
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'search results for "hop": 1', res.data)
+    self.assertIn(b'The Musical Hop', res.data)
+
+  def test_search_artists_counts_upcoming_shows(self):
+    with self.app.app_context():
+      results = search.search_artists('PETAL')
+
+    self.assertEqual(results['count'], 1)
+    self.assertEqual(results['data'][0]['name'], 'Guns N Petals')
+    self.assertEqual(results['data'][0]['num_upcoming_shows'], 3)
+
+  def test_search_without_match(self):
+    res = self.client().post('/artists/search',
+                             data={'search_term': 'zzz'})
+
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'search results for "zzz": 0', res.data)
+
+  def test_search_pages_link_to_each_other(self):
+    with self.app.app_context():
+      db.session.add_all([
+        Artist(name='Petal Pushers {}'.format(n), city='Austin', state='TX')
+        for n in range(search.SEARCH_RESULTS_PER_PAGE)])
+      db.session.commit()
+
+    res = self.client().post('/artists/search', data={'search_term': 'petal'})
+    self.assertIn(b'search results for "petal": 21', res.data)
+    self.assertNotIn(b'Previous results', res.data)
+    next_page = re.search(r'href="([^"]+)">Next results', res.get_data(as_text=True))
+
+    with self.assertQueryCount(1):
+      res = self.client().get(html.unescape(next_page.group(1)))
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'search results for "petal": 21', res.data)
+    self.assertEqual(res.data.count(b'<h5>'), 1)
+    self.assertIn(b'Previous results', res.data)
+    self.assertNotIn(b'Next results', res.data)
+
+  def test_search_page_past_the_end(self):
+    with self.assertQueryBudget():
+      res = self.client().get('/artists/search?search_term=petal&page=5')
+
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'search results for "petal": 1', res.data)
+    self.assertEqual(res.data.count(b'<h5>'), 0)
+    self.assertIn(b'Previous results', res.data)
+
+  def test_venue_page_served_from_cache(self):
+    path = '/venues/{}'.format(self.venue_id)
+    first = self.client().get(path)
+    with self.assertQueryCount(0):
+      res = self.client().get(path)
+
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res.data, first.data)
+    self.assertEqual(res.headers['ETag'], first.headers['ETag'])
+
+  def test_304_venue_page_not_modified(self):
+    path = '/venues/{}'.format(self.venue_id)
+    etag = self.client().get(path).headers['ETag']
+    res = self.client().get(path, headers={'If-None-Match': etag})
+
+    self.assertEqual(res.status_code, 304)
+    self.assertEqual(res.data, b'')
+
+  def test_new_show_invalidates_its_pages(self):
+    paths = ['/venues', '/artists', '/venues/{}'.format(self.venue_id),
+             '/artists/{}'.format(self.artist_id)]
+    for path in paths:
+      self.client().get(path)
+
+    res = self.client().post('/shows/create', data={
+        'venue_id': self.venue_id, 'artist_id': self.artist_id,
+        'start_time': (datetime.now() + timedelta(days=3)
+                       ).strftime('%Y-%m-%d %H:%M:%S')})
+    self.assertIn(b'Show was successfully listed!', res.data)
+
+    with self.assertQueryCount(0):
+      self.client().get('/artists')
+    res = self.client().get('/venues/{}'.format(self.venue_id))
+    self.assertIn(b'4 Upcoming Shows', res.data)
+    res = self.client().get('/artists/{}'.format(self.artist_id))
+    self.assertIn(b'4 Upcoming Shows', res.data)
+    with self.assertQueryCount(1):
+      self.client().get('/venues')
+
+  def test_cache_stats(self):
+    self.app.config['MONITORING_TOKEN'] = 'monitoring-token'
+    self.addCleanup(self.app.config.pop, 'MONITORING_TOKEN')
+    headers = {'Authorization': 'Bearer monitoring-token'}
+    before = json.loads(self.client().get('/cache/stats', headers=headers).data)
+    path = '/artists/{}'.format(self.artist_id)
+    self.client().get(path)
+    self.client().get(path)
+    res = self.client().get('/cache/stats', headers=headers)
+    data = json.loads(res.data)
+
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(data['hits'] - before['hits'], 1)
+    self.assertEqual(data['misses'] - before['misses'], 1)
+    self.assertEqual(data['size'], 1)
+
+  def test_import_shows(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'shows.csv')
+    with open(path, 'w') as f:
+      f.write('venue_name,artist_id,start_time\n'
+              'the musical hop,{0},2030-01-01 20:00:00\n'
+              'The Musical Hop,{0},2030-01-02 20:00:00\n'
+              'Nowhere,{0},2030-01-03 20:00:00\n'
+              'The Musical Hop,{0},tomorrow\n'.format(self.artist_id))
+
+    res = self.app.test_cli_runner().invoke(args=['import', 'shows', path])
+
+    self.assertEqual(res.exit_code, 0, res.output)
+    self.assertIn('Imported 2 shows', res.output)
+    self.assertIn('Rejected 2 rows', res.output)
+    with self.app.app_context():
+      self.assertEqual(Show.query.count(), 7)
+    with open(os.path.join(directory, 'shows.rejects.csv')) as f:
+      rejects = f.read()
+    self.assertIn("no venue named 'Nowhere'", rejects)
+    self.assertIn('start_time', rejects.splitlines()[2])
+
+  def test_import_json_array(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'shows.json')
+    with open(path, 'w') as f:
+      json.dump([
+        {'venue_name': 'The Musical Hop', 'artist_id': self.artist_id,
+         'start_time': '2030-01-01 20:00:00'},
+        {'venue_name': 'Nowhere', 'artist_id': self.artist_id,
+         'start_time': '2030-01-02 20:00:00'},
+        'not a show',
+      ], f, indent=2)
+
+    res = self.app.test_cli_runner().invoke(args=['import', 'shows', path])
+
+    self.assertEqual(res.exit_code, 0, res.output)
+    self.assertIn('Imported 1 shows', res.output)
+    self.assertIn('Rejected 2 rows', res.output)
+    with open(os.path.join(directory, 'shows.rejects.jsonl')) as f:
+      rejects = [json.loads(line) for line in f]
+    self.assertEqual(rejects[0]['venue_name'], 'Nowhere')
+    self.assertEqual(len(rejects), 2)
+
+  def test_import_json_not_an_array(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'venues.json')
+    with open(path, 'w') as f:
+      f.write('{"name": "The Dueling Pianos Bar"}\n{"name": "Park Square"}\n')
+
+    res = self.app.test_cli_runner().invoke(args=['import', 'venues', path])
+
+    self.assertEqual(res.exit_code, 1)
+    self.assertIn('is not valid JSON', res.output)
+
+  def test_import_drops_cached_pages(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'venues.csv')
+    with open(path, 'w') as f:
+      f.write('name,city,state,address,phone,genres,facebook_link\n'
+              'The Dueling Pianos Bar,New York,NY,335 Delancey Street,'
+              '914-003-1132,Jazz,https://www.facebook.com/pianos\n')
+    self.assertNotIn(b'Dueling Pianos', self.client().get('/venues').data)
+
+    res = self.app.test_cli_runner().invoke(args=['import', 'venues', path])
+
+    self.assertIn('Imported 1 venues', res.output)
+    self.assertIn(b'Dueling Pianos', self.client().get('/venues').data)
+
+  def test_pool_metrics(self):
+    self.app.config['MONITORING_TOKEN'] = 'monitoring-token'
+    self.addCleanup(self.app.config.pop, 'MONITORING_TOKEN')
+    self.client().get('/venues')
+    res = self.client().get('/pool/metrics', headers={
+        'Authorization': 'Bearer monitoring-token'})
+    data = json.loads(res.data)
+
+    self.assertEqual(res.status_code, 200)
+    self.assertTrue(data['checkouts'])
+    self.assertEqual(data['checked_out'], 0)
+    self.assertEqual(data['checkout_latency'][-1]['count'],
+                     data['checkouts'])
+
+  def test_401_monitoring_without_token(self):
+    self.app.config['MONITORING_TOKEN'] = 'monitoring-token'
+    self.addCleanup(self.app.config.pop, 'MONITORING_TOKEN')
+    for path in ('/pool/metrics', '/cache/stats'):
+      res = self.client().get(path)
+
+      self.assertEqual(res.status_code, 401, path)
+
+  def test_404_show_missing_venue(self):
+    res = self.client().get('/venues/1000')
+
+    self.assertEqual(res.status_code, 404)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+  unittest.main()
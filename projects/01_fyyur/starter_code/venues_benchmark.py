@@ -0,0 +1,140 @@
+'''
+Benchmark of the /venues listing: venue_areas(), one aggregated query,
+against building the same areas with a query per area and a count per
+venue. Reports the statements each runs and the mean time of --repeat
+runs, and the time of a whole GET /venues with the page cache cleared,
+over --venues venues with --shows shows.
+
+  python venues_benchmark.py --venues 10000 --shows 1000000
+
+The rows are written to a temporary SQLite file.
+'''
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import app
+from models import db, Venue, Artist, Show
+from page_cache import page_cache
+from queries import venue_areas
+from fsnd_common.query_budget import count_queries
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+  ('Seattle', 'WA')] + [('City {}'.format(n), 'ST') for n in range(50)]
+
+
+def seed(venues, artists, shows):
+  random.seed(1)
+  db.create_all()
+  db.session.execute(Venue.__table__.insert(), [{
+    'id': n + 1,
+    'name': 'Venue {} Musical Hop'.format(n),
+    'city': CITIES[n % len(CITIES)][0],
+    'state': CITIES[n % len(CITIES)][1],
+    'image_link': 'https://example.com/venues/{}.jpg'.format(n),
+  } for n in range(venues)])
+  db.session.execute(Artist.__table__.insert(), [{
+    'id': n + 1,
+    'name': 'Artist {} Band'.format(n),
+    'city': 'San Francisco',
+    'state': 'CA',
+    'image_link': 'https://example.com/artists/{}.jpg'.format(n),
+  } for n in range(artists)])
+  now = datetime.now()
+  for start in range(0, shows, 100000):
+    db.session.execute(Show.__table__.insert(), [{
+      'venue_id': random.randint(1, venues),
+      'artist_id': random.randint(1, artists),
+      'start_time': now + timedelta(hours=random.randint(-20000, 20000)),
+    } for _ in range(start, min(start + 100000, shows))])
+  db.session.commit()
+
+
+def temporary_database(name):
+  '''Points the app at a new SQLite file; returns its directory'''
+  directory = tempfile.mkdtemp()
+  app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+    directory, name)
+  app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+  return directory
+
+
+def area_by_area(now):
+  # One query for the areas, one per area for its venues, one count of
+  # upcoming shows per venue
+  areas = []
+  cities = db.session.query(Venue.city, Venue.state).distinct().order_by(
+    Venue.state, Venue.city)
+  for city, state in cities:
+    venues = Venue.query.filter_by(city=city, state=state).order_by(
+      Venue.name, Venue.id)
+    areas.append({
+      'city': city,
+      'state': state,
+      'venues': [{
+        'id': venue.id,
+        'name': venue.name,
+        'num_upcoming_shows': Show.query.filter(
+          Show.venue_id == venue.id, Show.start_time > now).count(),
+      } for venue in venues]
+    })
+  return areas
+
+
+def measure(function, repeat):
+  '''Statements and mean time of repeat calls, in seconds, and the output'''
+  with count_queries() as log:
+    output = function()
+  db.session.remove()
+  started = time.perf_counter()
+  for _ in range(repeat):
+    function()
+    db.session.remove()
+  return output, log.count(), (time.perf_counter() - started) / repeat
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=1000)
+  parser.add_argument('--shows', type=int, default=100000)
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  directory = temporary_database('venues.db')
+  client = app.test_client()
+
+  def get_venues():
+    page_cache.clear()
+    response = client.get('/venues')
+    assert response.status_code == 200
+    return response.get_data()
+
+  try:
+    with app.app_context():
+      seed(args.venues, args.artists, args.shows)
+      now = datetime.now()
+      results = [
+        ('venue_areas()', measure(lambda: list(venue_areas(now)),
+                                  args.repeat)),
+        ('area by area', measure(lambda: area_by_area(now), args.repeat)),
+        ('GET /venues', measure(get_venues, args.repeat)),
+      ]
+      db.engine.dispose()
+  finally:
+    shutil.rmtree(directory)
+
+  assert results[0][1][0] == results[1][1][0], 'the two listings differ'
+  print('{} venues, {} shows, mean of {}'.format(
+    args.venues, args.shows, args.repeat))
+  for name, (_, statements, seconds) in results:
+    print('  {:14} {:6d} statements {:10.1f} ms'.format(
+      name, statements, seconds * 1000))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,252 @@
+'''
+Async (ASGI) serving mode of the trivia API.
+
+The categories, questions, search and quizzes endpoints of flaskr on
+Quart, with queries run by the `databases` async drivers (asyncpg on
+PostgreSQL, aiosqlite on SQLite). Responses are built with the same
+formatting, search statements, category cache and quiz index as the sync
+app, so both modes return the same JSON. Serve it with an ASGI server:
+
+    pip install -r requirements-async.txt
+    hypercorn 'asgi:create_app()' --bind 0.0.0.0:5000
+'''
+from databases import Database
+from quart import Quart, request, jsonify
+from sqlalchemy import func, select, text
+
+from models import (database_path, Question, Category, CATEGORY_FIELDS,
+                    select_questions, select_question_categories,
+                    format_question, format_category)
+from categories import category_cache
+from quiz import question_index
+from search import SEARCH_INDEX_EXISTS, search_statements
+from fsnd_common.pool import POOL_SETTINGS, STATEMENT_TIMEOUT_SETTING, _setting
+from flaskr import QUESTIONS_PER_PAGE
+
+questions = Question.__table__
+categories = Category.__table__
+
+
+def database_options(database_url, config=None):
+    '''
+    Pool options of the async driver for the DB_POOL_* settings: asyncpg
+    keeps DB_POOL_SIZE connections and opens up to DB_MAX_OVERFLOW more.
+    aiosqlite opens a connection per query and takes none.
+    '''
+    if not database_url.startswith('postgres'):
+        return {}
+
+    settings = {name: _setting(config, name, type, default)
+                for name, (_, type, default) in POOL_SETTINGS.items()}
+    options = {
+        'min_size': settings['DB_POOL_SIZE'],
+        'max_size': settings['DB_POOL_SIZE'] + settings['DB_MAX_OVERFLOW'],
+    }
+    statement_timeout = _setting(config, STATEMENT_TIMEOUT_SETTING, int, 0)
+    if statement_timeout:
+        options['server_settings'] = {
+            'statement_timeout': str(statement_timeout)}
+    return options
+
+
+def create_app(test_config=None, database_url=database_path):
+    # create and configure the app
+    app = Quart(__name__)
+    # Use the planner's row estimate for total_questions on large tables
+    app.config['APPROXIMATE_TOTAL_QUESTIONS'] = False
+    if test_config:
+        app.config.update(test_config)
+
+    database = Database(database_url,
+                        **database_options(database_url, app.config))
+    dialect = 'sqlite' if database_url.startswith('sqlite') else 'postgresql'
+    search_indexed = False
+
+    @app.before_serving
+    async def connect():
+        nonlocal search_indexed
+        await database.connect()
+        # The sync app creates the index; here it is only looked up
+        search_indexed = await database.fetch_val(
+            text(SEARCH_INDEX_EXISTS[dialect])) is not None
+
+    @app.after_serving
+    async def disconnect():
+        await database.disconnect()
+
+    async def all_categories():
+        # The shared cache, filled with an async query when stale
+        if not category_cache.is_fresh():
+            version = category_cache.version
+            rows = await database.fetch_all(
+                select([categories.c[field] for field in CATEGORY_FIELDS])
+                .order_by(categories.c.id))
+            category_cache.load([format_category(row) for row in rows],
+                                version)
+        return category_cache.all()
+
+    async def sample_question(category, previous_questions):
+        if question_index.is_stale():
+            generation = question_index.generation
+            rows = await database.fetch_all(select_question_categories())
+            question_index.load([(row['id'], row['category']) for row in rows],
+                                generation)
+
+        question_id = question_index.sample(category, previous_questions)
+        if question_id is None:
+            return None
+        row = await database.fetch_one(
+            select_questions(questions.c.id == question_id))
+        if row is None:
+            # Deleted since the index was built
+            question_index.invalidate()
+            return await sample_question(category, previous_questions)
+        return format_question(row)
+
+    async def total_questions():
+        if app.config['APPROXIMATE_TOTAL_QUESTIONS'] and dialect != 'sqlite':
+            value = await database.fetch_val(
+                text('SELECT reltuples::bigint FROM pg_class '
+                     'WHERE relname = :table').bindparams(
+                    table=questions.name))
+            if value and value > 0:
+                return value
+        return await database.fetch_val(
+            select([func.count()]).select_from(questions))
+
+    # CORS Headers: Allow '*' for origins, as flask_cors does for flaskr
+    @app.after_request
+    async def after_request(response):
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Headers'] = \
+            'Content-Type,Authorization,true'
+        response.headers['Access-Control-Allow-Methods'] = \
+            'GET,POST,DELETE,OPTIONS'
+        return response
+
+    @app.route('/categories', methods=['GET'])
+    async def get_categories():
+        formatted_categories = await all_categories()
+
+        return jsonify({
+            'success': True,
+            'categories': formatted_categories,
+            'total_categories': len(formatted_categories)
+        })
+
+    @app.route('/questions', methods=['GET', 'POST'])
+    async def get_questions():
+        if request.method == 'POST':
+            body = await request.get_json()
+            search = body.get('searchTerm', None)
+
+            if search:
+                # SEARCH QUESTION: question or answer containing search term
+                total, rows = search_statements(
+                    search,
+                    page=request.args.get('page', 1, type=int),
+                    per_page=QUESTIONS_PER_PAGE,
+                    dialect=dialect,
+                    indexed=search_indexed)
+                return jsonify({
+                    'success': True,
+                    'questions': [format_question(row) for row
+                                  in await database.fetch_all(rows)],
+                    'total_questions': await database.fetch_val(total),
+                })
+
+            else:
+                # Create a new Question
+                try:
+                    await database.execute(questions.insert().values(
+                        question=body['question'],
+                        answer=body['answer'],
+                        category=body['category'],
+                        difficulty=body['difficulty']))
+                    question_index.invalidate()
+                    return jsonify({'success': True, })
+                except:  # noqa
+                    return unprocessable(422)
+
+        else:  # GET: keyset pagination with ?cursor, else ?page
+            query = select_questions()
+            cursor = request.args.get('cursor', None, type=int)
+            if cursor is not None:
+                query = query.where(questions.c.id > cursor)
+            else:
+                page = max(request.args.get('page', 1, type=int), 1)
+                query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
+
+            formatted_questions = [format_question(row) for row in
+                                   await database.fetch_all(
+                                       query.limit(QUESTIONS_PER_PAGE))]
+            next_cursor = None
+            if len(formatted_questions) == QUESTIONS_PER_PAGE:
+                next_cursor = formatted_questions[-1]['id']
+
+            return jsonify({
+                'success': True,
+                'questions': formatted_questions,
+                'categories': await all_categories(),
+                'total_questions': await total_questions(),
+                'next_cursor': next_cursor,
+                'current_category': {'id': 1, 'type': 'Science'}
+            })
+
+    @app.route('/categories/<int:category_id>/questions', methods=['GET'])
+    async def get_questions_by_category_id(category_id):
+        try:
+            await all_categories()
+            category = category_cache.get(category_id)
+            if not category:
+                return not_found('Category not found!')
+
+            rows = await database.fetch_all(
+                select_questions(questions.c.category == category['id']))
+            formatted_questions = [format_question(row) for row in rows]
+
+            return jsonify({
+                'success': True,
+                'questions': formatted_questions,
+                'categories': category_cache.all(),
+                'total_questions': len(formatted_questions),
+                'current_category': category
+            })
+        except:  # noqa
+            return unprocessable(422)
+
+    @app.route('/quizzes', methods=['POST'])
+    async def get_quizzes():
+        try:
+            body = await request.get_json()
+            given_category = body.get('quiz_category', None)
+            previous_questions = body.get('previous_questions', [])
+            category_id = given_category['id']
+            question = await sample_question(
+                category_id if category_id != 0 else None,  # 0 means ALL
+                previous_questions)
+
+            return jsonify({
+                'success': True,
+                'question': question or False,
+            })
+        except:  # noqa
+            return unprocessable(422)
+
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({
+            "success": False,
+            "error": 404,
+            "message": "Not found"
+        }), 404
+
+    @app.errorhandler(422)
+    def unprocessable(error):
+        return jsonify({
+            "success": False,
+            "error": 422,
+            "message": "Unprocessable"
+        }), 422
+
+    return app
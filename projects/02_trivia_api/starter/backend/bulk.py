@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+
+from sqlalchemy.exc import DBAPIError
+
+from models import (db, unit_of_work, Question, QUESTION_FIELDS,
+                    select_questions, format_question)
+from categories import category_cache
+
+# Rows inserted per statement and per transaction
+IMPORT_BATCH_SIZE = 1000
+# Rows fetched from the server-side cursor at a time when exporting
+EXPORT_BATCH_SIZE = 1000
+# Row errors listed in an import report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, format='jsonl'):
+    '''
+    Yields (line number, row dict) from a binary stream of JSON Lines or
+    CSV with a header, one line at a time. Unparsable lines yield None.
+    '''
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(text, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def _integer(value, field):
+    '''
+    Integers, and strings of one as read from CSV, are accepted as is;
+    int() would also take True or truncate 2.7, so those are rejected.
+    '''
+    if isinstance(value, str):
+        value = value.strip()
+        if value.lstrip('+-').isdigit():
+            return int(value)
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return value
+    elif isinstance(value, float) and value.is_integer():
+        return int(value)
+    raise RowError('{} must be an integer'.format(field))
+
+
+def _values(row):
+    if row is None:
+        raise RowError('not a JSON object')
+
+    values = {}
+    for field in ('question', 'answer'):
+        value = row.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise RowError('{} is required'.format(field))
+        values[field] = value.strip()
+
+    for field in ('category', 'difficulty'):
+        values[field] = _integer(row.get(field), field)
+
+    if category_cache.get(values['category']) is None:
+        raise RowError('no category {}'.format(values['category']))
+    return values
+
+
+def import_questions(rows, batch_size=IMPORT_BATCH_SIZE):
+    '''
+    Inserts questions from (line number, row) pairs in batches of
+    batch_size, one unit_of_work() each, and returns a report of the rows
+    imported and rejected with the reason for each rejected line.
+
+    Called inside a unit_of_work() every batch joins it instead, and a
+    batch the database refuses raises rather than being retried row by
+    row, as that would need the whole transaction rolled back.
+
+    Ids in the input are ignored: imported questions get new ids.
+    '''
+    report = {'imported': 0, 'rejected': 0, 'errors': []}
+
+    def reject(number, error):
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': number, 'error': error})
+
+    batch = []
+    for number, row in rows:
+        try:
+            batch.append((number, _values(row)))
+        except RowError as error:
+            reject(number, str(error))
+            continue
+        if len(batch) >= batch_size:
+            report['imported'] += _insert_batch(batch, reject)
+            batch = []
+    if batch:
+        report['imported'] += _insert_batch(batch, reject)
+    return report
+
+
+def _insert_batch(batch, reject):
+    # One executemany INSERT per batch. If it fails the rows are retried one
+    # at a time so only the offending ones are rejected.
+    try:
+        _insert([values for _, values in batch])
+        return len(batch)
+    except DBAPIError:
+        if db.session.info.get('unit_of_work'):
+            raise  # inside a caller's unit of work, which fails as a whole
+
+    imported = 0
+    for number, values in batch:
+        try:
+            _insert([values])
+            imported += 1
+        except DBAPIError as error:
+            reject(number, str(error.orig).strip())
+    return imported
+
+
+def _insert(rows):
+    # Committed, or rolled back, by its own unit of work unless it joins an
+    # enclosing one. Core inserts skip the mapper events, so the change is
+    # flagged for the quiz index as Question.insert() would.
+    with unit_of_work() as session:
+        session.execute(Question.__table__.insert(), rows)
+        session.info['questions_changed'] = True
+
+
+def _exported_rows():
+    result = db.session.execute(
+        select_questions().execution_options(stream_results=True))
+    try:
+        while True:
+            rows = result.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        result.close()
+
+
+def export_questions(format='jsonl'):
+    '''
+    Yields every question as JSON Lines (in the shape of
+    Question.format()) or CSV, one chunk per batch of rows read from a
+    server-side cursor, so the table is never held in memory.
+    '''
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(QUESTION_FIELDS)
+        for rows in _exported_rows():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():  # an empty table still gets its header
+            yield buffer.getvalue()
+        return
+
+    for rows in _exported_rows():
+        yield ''.join(json.dumps(format_question(row)) + '\n'
+                      for row in rows)
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Category, CATEGORY_FIELDS, format_category
+
+# Seconds the cached categories are trusted, to pick up other processes
+CATEGORY_CACHE_TTL = 300
+
+
+class CategoryCache:
+    '''
+    In-process cache of the formatted categories and an id -> category map.
+
+    Writing a category bumps `version`; the cache is rebuilt on first use
+    after the version it was built from is no longer current, or after
+    CATEGORY_CACHE_TTL seconds.
+    '''
+
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._categories = []
+        self._by_id = {}
+        self._built_version = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self.version += 1
+
+    def all(self):
+        '''
+        List of formatted categories, as returned by Category.format().
+        '''
+        self._ensure_fresh()
+        return self._categories
+
+    def get(self, category_id):
+        '''
+        Formatted category with the given id, or None.
+        '''
+        self._ensure_fresh()
+        return self._by_id.get(category_id)
+
+    def is_fresh(self):
+        return (self._built_version == self.version and
+                time.monotonic() < self._expires_at)
+
+    def _ensure_fresh(self):
+        if self.is_fresh():
+            self.hits += 1
+            return
+
+        with self._lock:
+            if self.is_fresh():  # rebuilt by another thread meanwhile
+                self.hits += 1
+                return
+            self.misses += 1
+            version = self.version
+            table = Category.__table__
+            # Read from the primary: the session may be routed to a replica
+            # that has not caught up with the write that invalidated us
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    db.select([table.c[field] for field in CATEGORY_FIELDS])
+                    .order_by(table.c.id)).fetchall()
+            self.load([format_category(row) for row in rows], version)
+
+    def load(self, categories, version):
+        '''
+        Replaces the cached categories with formatted ones read while
+        `version` was current.
+        '''
+        self._categories = categories
+        self._by_id = {category['id']: category for category in categories}
+        self._built_version = version
+        self._expires_at = time.monotonic() + self.ttl
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'version': self.version,
+            'size': len(self._categories)
+        }
+
+
+category_cache = CategoryCache()
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_delete')
+@event.listens_for(Category, 'after_update')
+def _category_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['categories_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_category_cache(session):
+    if session.info.pop('categories_changed', False):
+        category_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_category_changes(session):
+    session.info.pop('categories_changed', None)
@@ -0,0 +1,124 @@
+'''
+Benchmark of ix_questions_category_id, the (category, id) index: the
+category queries without the index and with it. Reports the mean of
+--repeat runs of each query and its plan, over --rows questions spread
+over six categories plus a rare one holding --rare of them.
+
+    python category_index_benchmark.py --rows 1000000
+
+The queries are the listing of GET /categories/<id>/questions for the
+rare category, the count and ordered ids of a category holding a sixth
+of the rows, and the (id, category) rows QuestionIndex is rebuilt from.
+The questions are written to a temporary SQLite file; the plans with the
+index must use it.
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import func, select, text
+
+from models import (setup_db, db, Question, Category, select_questions,
+                    select_question_categories)
+
+INDEX = 'ix_questions_category_id'
+RARE_CATEGORY = 7
+
+
+def seed(rows, rare):
+    db.session.execute(Category.__table__.insert(), [
+        {'id': id, 'type': type} for id, type in enumerate(
+            ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+             'Sports', 'Rare'], 1)])
+    every = max(rows // rare, 1)
+    db.session.execute(Question.__table__.insert(), [{
+        'question': 'Question number {} about topic {}?'.format(n, n % 97),
+        'answer': 'Answer {}'.format(n),
+        'category': RARE_CATEGORY if n % every == 0 else n % 6 + 1,
+        'difficulty': n % 5 + 1,
+    } for n in range(rows)])
+    db.session.commit()
+
+
+def queries():
+    questions = Question.__table__
+    return [
+        ('rare category listing',
+         select_questions(questions.c.category == RARE_CATEGORY)),
+        ('large category count',
+         select([func.count()]).select_from(questions)
+         .where(questions.c.category == 1)),
+        ('large category ids',
+         select([questions.c.id]).where(questions.c.category == 1)
+         .order_by(questions.c.id)),
+        ('QuestionIndex rebuild', select_question_categories()),
+    ]
+
+
+def plan(statement):
+    sql = str(statement.compile(db.engine,
+                                compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))
+    return '; '.join(row[-1] for row in rows)
+
+
+def mean(statement, repeat):
+    '''Mean time of repeat runs, in seconds, and the rows of the last'''
+    db.session.execute(statement).fetchall()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rows = db.session.execute(statement).fetchall()
+    return rows, (time.perf_counter() - started) / repeat
+
+
+def measure(repeat):
+    return [(name, plan(statement)) + mean(statement, repeat)
+            for name, statement in queries()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--rare', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    app = Flask(__name__)
+    try:
+        setup_db(app, 'sqlite:///' + os.path.join(directory, 'index.db'))
+        with app.app_context():
+            seed(args.rows, args.rare)
+            db.session.execute(text('DROP INDEX {}'.format(INDEX)))
+            db.session.execute(text('ANALYZE'))
+            without = measure(args.repeat)
+            for index in Question.__table__.indexes:
+                if index.name == INDEX:
+                    index.create(db.session.connection())
+            db.session.execute(text('ANALYZE'))
+            with_index = measure(args.repeat)
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+    for (name, _, rows, _), (_, plan_with, indexed_rows, _) in zip(
+            without, with_index):
+        assert sorted(rows) == sorted(indexed_rows), name
+        assert INDEX in plan_with, '{} does not use {}'.format(name, INDEX)
+
+    print('{} questions, {} in the rare category, mean of {}'.format(
+        args.rows, args.rare, args.repeat))
+    for (name, plan_without, _, before), (_, plan_with, _, after) in zip(
+            without, with_index):
+        print('  {:22} {:9.1f} ms -> {:8.1f} ms'.format(
+            name, before * 1000, after * 1000))
+        print('    without: {}'.format(plan_without))
+        print('    with:    {}'.format(plan_with))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import os
+import time
+
+from flask import current_app, g, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+# Smallest body, in bytes, worth compressing: below it the headers and the
+# CPU time cost more than the bytes saved
+COMPRESS_MIN_SIZE = 500
+COMPRESS_GZIP_LEVEL = 6
+# Brotli quality; 4 compresses better than gzip -6 in about the same time
+COMPRESS_BROTLI_QUALITY = 4
+COMPRESS_MIMETYPES = ('application/json',)
+# Seconds a versioned ETag stays valid, so that writes made by other
+# processes, which do not bump this one's versions, show up in time
+VERSIONED_ETAG_TTL = 300
+
+# Versioned ETags are only meaningful to the process that issued them
+_PROCESS_TOKEN = os.urandom(8).hex()
+
+
+def _encoding():
+    # br over gzip, as long as the client accepts it
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def versioned_etag(view):
+    '''
+    Decorator marking a view whose GET response only changes with the
+    data versions given to conditional_get(). Put it right under
+    @app.route.
+    '''
+    view.versioned_etag = True
+    return view
+
+
+def conditional_get(versions):
+    '''
+    before_request stage for the views marked @versioned_etag. Their ETag
+    hashes versions(), the full path, the process and the current
+    VERSIONED_ETAG_TTL period rather than the body, so a request whose
+    If-None-Match matches gets its 304 before the view runs a query.
+    '''
+    def check():
+        view = current_app.view_functions.get(request.endpoint)
+        if (request.method not in ('GET', 'HEAD') or
+                not getattr(view, 'versioned_etag', False)):
+            return None
+
+        # Read before the view runs: a write in between only costs a 200
+        key = '{}:{}:{!r}:{}'.format(
+            _PROCESS_TOKEN, int(time.time() // VERSIONED_ETAG_TTL),
+            versions(), request.full_path)
+        etag = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        g.versioned_etag = etag
+
+        # The body size, which decides whether it is compressed, is
+        # unknown here; it is the same as when either tag was sent
+        encoding = _encoding()
+        for tag in (etag, etag + '-' + encoding if encoding else etag):
+            if request.if_none_match.contains(tag):
+                response = current_app.response_class(
+                    status=304, mimetype='application/json')
+                response.set_etag(tag)
+                response.vary.add('Accept-Encoding')
+                return response
+        return None
+    return check
+
+
+def compress_response(response):
+    '''
+    after_request stage giving successful JSON responses a strong ETag
+    and compressing them with brotli or gzip.
+
+    The ETag is the one conditional_get() derived from the data versions,
+    or else a hash of the serialized body, and names the encoding as each
+    encoding is a different representation. A request whose If-None-Match
+    matches gets a 304 before anything is compressed.
+    Responses under COMPRESS_MIN_SIZE bytes are not compressed.
+    '''
+    if (response.status_code != 200 or response.direct_passthrough or
+            response.is_streamed or
+            response.mimetype not in COMPRESS_MIMETYPES or
+            'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    min_size = current_app.config.get('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)
+    encoding = _encoding() if len(data) >= min_size else None
+    response.vary.add('Accept-Encoding')
+
+    etag = g.get('versioned_etag')
+    if etag is None:
+        etag = hashlib.blake2b(data, digest_size=16).hexdigest()
+    response.set_etag(etag + '-' + encoding if encoding else etag)
+    response.make_conditional(request)
+    if response.status_code == 304 or encoding is None:
+        return response
+
+    response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
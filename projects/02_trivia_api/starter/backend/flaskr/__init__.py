@@ -1,22 +1,88 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import exc
 import random
+from fsnd_common.instrumentation import init_metrics
+from fsnd_common.json_backend import init_json
+from fsnd_common.monitoring import requires_monitoring_token
+from fsnd_common.pool import pools_snapshot
+from fsnd_common.query_budget import init_query_budget, query_budget
 
-from models import setup_db, Question, Category
+from models import (setup_db, db, Question, select_questions,
+                    format_question)
+from quiz import random_question, question_index
+from categories import category_cache
+from search import create_search_index, search_questions
+from bulk import read_rows, import_questions, export_questions
+from compress import (COMPRESS_MIN_SIZE, compress_response,
+                      conditional_get, versioned_etag)
 
 QUESTIONS_PER_PAGE = 10
 
+# Formats accepted by the bulk import and export endpoints
+BULK_MIMETYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def paginate_questions(request, selection):
+    '''
+    Returns one page of formatted questions from the given
+    select_questions() statement and the cursor of the following page.
+
+    `?page=n` pages with LIMIT/OFFSET. `?cursor=<id>` returns the questions
+    after that id instead (keyset pagination), which stays as fast on deep
+    pages as on the first one.
+    '''
+    cursor = request.args.get('cursor', None, type=int)
+    if cursor is not None:
+        selection = selection.where(Question.id > cursor)
+    else:
+        page = max(request.args.get('page', 1, type=int), 1)
+        selection = selection.offset((page - 1) * QUESTIONS_PER_PAGE)
+
+    questions = [format_question(row) for row in db.session.execute(
+        selection.limit(QUESTIONS_PER_PAGE))]
+    next_cursor = None
+    if len(questions) == QUESTIONS_PER_PAGE:
+        next_cursor = questions[-1]['id']
+
+    return questions, next_cursor
+
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    # Use the planner's row estimate for total_questions on large tables
+    app.config['APPROXIMATE_TOTAL_QUESTIONS'] = False
+    # Smallest JSON body compressed, in bytes, see compress.py
+    app.config['COMPRESS_MIN_SIZE'] = COMPRESS_MIN_SIZE
+    if test_config:
+        app.config.update(test_config)
+    # orjson unless JSON_BACKEND is 'json', see fsnd_common/json_backend.py
+    init_json(app)
+    # GET /metrics when METRICS_ENABLED is set, see
+    # fsnd_common/instrumentation.py
+    init_metrics(app)
+    # Logs or fails requests over their @query_budget when QUERY_BUDGET_MODE
+    # is 'warn' or 'fail', see fsnd_common/query_budget.py
+    init_query_budget(app)
 
     # Set up CORS. Allow '*' for origins.
     CORS(app)
 
     setup_db(app)
+    with app.app_context(), db.engine.begin() as connection:
+        create_search_index(connection)
+
+    # 304s from the data versions for @versioned_etag views, then ETags
+    # and gzip/brotli for JSON responses
+    app.before_request(conditional_get(
+        lambda: (category_cache.version, question_index.generation)))
+    app.after_request(compress_response)
 
     # CORS Headers: Use the after_request decorator to set Access-Control-Allow
     @app.after_request
@@ -28,13 +94,14 @@ def create_app(test_config=None):
         return response
 
     @app.route('/categories', methods=['GET'])
+    @query_budget(1)
+    @versioned_etag
     def get_categories():
         '''
         Endpoint to handle GET requests for all available categories.
         '''
 
-        categories = Category.query.all()
-        formatted_categories = [category.format() for category in categories]
+        formatted_categories = category_cache.all()
 
         return jsonify({
             'success': True,
@@ -43,6 +110,7 @@ def create_app(test_config=None):
         })
 
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
+    @query_budget(2)
     def delete_question(question_id):
         '''
         Endpoint to handle DELETE requests: Questions objects.
@@ -60,106 +128,129 @@ def create_app(test_config=None):
         else:  # Question doesn't exist in the database, return 404
             return not_found('Question not found')
 
-    @app.route('/questions', methods=['GET', 'POST'])
+    # Worst case, on PostgreSQL with APPROXIMATE_TOTAL_QUESTIONS and cold
+    # caches: the page, the planner estimate, the COUNT(*) it falls back to
+    # on a table never analyzed, and the categories
+    @app.route('/questions', methods=['GET'])
+    @query_budget(4)
+    @versioned_etag
     def get_questions():
         '''
-        Endpoint to handle GET and POST requests for Questions.
+        Endpoint to handle GET requests for Questions.
         '''
+        formatted_questions, next_cursor = paginate_questions(
+            request, select_questions())
+        total_questions = Question.total(
+            approximate=app.config['APPROXIMATE_TOTAL_QUESTIONS'])
 
-        if request.method == 'POST':
-            body = request.get_json()
-            search = body.get('searchTerm', None)
-
-            if search:
-                # SEARCH QUESTION: containing given search term
-                questions = Question.query.filter(
-                    Question.question.ilike('%{}%'.format(search))).all()
-                formatted_questions = [question.format()
-                                       for question in questions]
-                return jsonify({
-                    'success': True,
-                    'questions': formatted_questions,
-                })
-
-            else:
-                # Create a new Question
-                try:
-                    new_question = Question(question=body['question'],
-                                            answer=body['answer'],
-                                            category=body['category'],
-                                            difficulty=body['difficulty'])
-                    new_question.insert()
-                    return jsonify({'success': True, })
-                except:  # noqa
-                    return unprocessable(422)
-
-        else:  # GET
-            page = request.args.get('page', 1, type=int)
-            start = (page - 1) * QUESTIONS_PER_PAGE
-            end = start + QUESTIONS_PER_PAGE
-
-            questions = Question.query.all()
-            formatted_questions = [question.format() for question in questions]
-            formatted_questions = formatted_questions[start:end]
-
-            categories = Category.query.all()
-            formatted_categories = [category.format()
-                                    for category in categories]
+        return jsonify({
+            'success': True,
+            'questions': formatted_questions,
+            'categories': category_cache.all(),
+            'total_questions': total_questions,
+            'next_cursor': next_cursor,
+            'current_category': {'id': 1, 'type': 'Science'}
+        })
 
+    # A search runs its count and its page; creating runs one INSERT
+    @app.route('/questions', methods=['POST'])
+    @query_budget(2)
+    def create_or_search_questions():
+        '''
+        Endpoint to handle POST requests for Questions: a search when the
+        body has a searchTerm, else a new Question.
+        '''
+        body = request.get_json()
+        search = body.get('searchTerm', None)
+
+        if search:
+            # SEARCH QUESTION: question or answer containing search term
+            formatted_questions, total_questions = search_questions(
+                search,
+                page=request.args.get('page', 1, type=int),
+                per_page=QUESTIONS_PER_PAGE)
             return jsonify({
                 'success': True,
                 'questions': formatted_questions,
-                'categories': formatted_categories,
-                'total_questions': len(questions),
-                'current_category': {'id': 1, 'type': 'Science'}
+                'total_questions': total_questions,
             })
 
+        # Create a new Question
+        try:
+            new_question = Question(question=body['question'],
+                                    answer=body['answer'],
+                                    category=body['category'],
+                                    difficulty=body['difficulty'])
+            new_question.insert()
+            return jsonify({'success': True, })
+        except:  # noqa
+            return unprocessable(422)
+
+    # No @query_budget: the import runs one INSERT per IMPORT_BATCH_SIZE rows
+    @app.route('/questions/import', methods=['POST'])
+    def bulk_import():
+        '''
+        Endpoint to import many questions from a JSON Lines or CSV body,
+        read as it arrives and inserted in batches.
+        '''
+        format = request.args.get(
+            'format', 'csv' if request.mimetype == 'text/csv' else 'jsonl')
+        if format not in BULK_MIMETYPES:
+            return unprocessable(422)
+
+        report = import_questions(read_rows(request.stream, format))
+        return jsonify(dict(report, success=True))
+
+    @app.route('/questions/export', methods=['GET'])
+    @query_budget(1)
+    def bulk_export():
+        '''
+        Endpoint to stream every question as JSON Lines or CSV.
+        '''
+        format = request.args.get('format', 'jsonl')
+        if format not in BULK_MIMETYPES:
+            return unprocessable(422)
+
+        return Response(stream_with_context(export_questions(format)),
+                        mimetype=BULK_MIMETYPES[format])
+
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
+    @query_budget(2)
+    @versioned_etag
     def get_questions_by_category_id(category_id):
         '''
           GET endpoint to get questions based on category.
         '''
         try:
-            category = Category.query.filter(
-                Category.id == category_id).one_or_none()
+            category = category_cache.get(category_id)
             if not category:
-                not_found('Category not found!')
-
-            questions = Question.query.filter(
-                Question.category == category.id).all()
-            formatted_questions = [question.format() for question in questions]
+                return not_found('Category not found!')
 
-            # Get all Categories
-            categories = Category.query.all()
-            formatted_categories = [category.format()
-                                    for category in categories]
+            formatted_questions = [
+                format_question(row) for row in db.session.execute(
+                    select_questions(Question.category == category['id']))]
 
             return jsonify({
                 'success': True,
                 'questions': formatted_questions,
-                'categories': formatted_categories,
+                'categories': category_cache.all(),
                 'total_questions': len(formatted_questions),
-                'current_category': category.format()
+                'current_category': category
             })
         except:  # noqa
             return unprocessable(422)
 
     @app.route('/quizzes', methods=['POST'])
+    @query_budget(3)
     def get_quizzes():
         try:
             body = request.get_json()
             given_category = body.get('quiz_category', None)
             previous_questions = body.get('previous_questions', [])
-            if given_category['id'] != 0:
-                question = Question.query.filter(
-                    Question.id.notin_(previous_questions),
-                    Question.category == given_category['id']).first()
-                print(question)
-            else:
-                # ALL
-                question = Question.query.filter(
-                    Question.id.notin_(previous_questions)).first()
-                print(question)
+            category_id = given_category['id']
+            question = random_question(
+                category_id if category_id != 0 else None,  # 0 means ALL
+                previous_questions)
 
             return jsonify({
                 'success': True,
@@ -168,6 +259,33 @@ def create_app(test_config=None):
         except:  # noqa
             return unprocessable(422)
 
+    @app.route('/pool/metrics', methods=['GET'])
+    @query_budget(0)
+    @requires_monitoring_token
+    def get_pool_metrics():
+        '''
+        Endpoint to monitor the database connection pools: the primary's
+        at the top level, the replicas' under 'binds'.
+        '''
+        return jsonify(dict(pools_snapshot(db, app), success=True))
+
+    @app.errorhandler(exc.TimeoutError)
+    def pool_exhausted(error):
+        # No connection became free within DB_POOL_TIMEOUT
+        return jsonify({
+            "success": False,
+            "error": 503,
+            "message": "Service unavailable"
+        }), 503, {'Retry-After': '1'}
+
+    @app.errorhandler(401)
+    def unauthorized(error):
+        return jsonify({
+            "success": False,
+            "error": 401,
+            "message": "Unauthorized"
+        }), 401
+
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({
@@ -0,0 +1,97 @@
+'''
+Benchmark of jsonify() with Flask's stdlib encoder and with the orjson
+backend of fsnd_common.json_backend, over payloads shaped like the responses of
+the trivia and coffee shop APIs.
+
+    python json_benchmark.py
+'''
+import datetime
+import decimal
+import timeit
+
+from flask import Flask, jsonify
+
+from fsnd_common import json_backend
+
+CATEGORIES = [{'id': id, 'type': type} for id, type in enumerate(
+    ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports'], 1)]
+
+
+def _questions(count):
+    return [{
+        'id': id,
+        'question': 'Which Dutch graphic artist-initials M C was a creator '
+                    'of optical illusions? ({})'.format(id),
+        'answer': 'Escher',
+        'category': id % 6 + 1,
+        'difficulty': id % 5 + 1,
+    } for id in range(1, count + 1)]
+
+
+def _drinks(count):
+    # Drink.long()
+    return [{
+        'id': id,
+        'title': 'Drink {}'.format(id),
+        'recipe': [{'name': name, 'color': color, 'parts': parts}
+                   for name, color, parts in (('water', 'blue', 1),
+                                              ('milk', 'white', 2),
+                                              ('coffee', 'brown', 1))],
+    } for id in range(1, count + 1)]
+
+
+PAYLOADS = {
+    # GET /questions
+    'questions page': lambda: {
+        'success': True, 'questions': _questions(10),
+        'categories': CATEGORIES, 'total_questions': 1000,
+        'next_cursor': 10, 'current_category': CATEGORIES[0]},
+    # GET /categories/<id>/questions on a large table
+    '1000 questions': lambda: {
+        'success': True, 'questions': _questions(1000),
+        'categories': CATEGORIES, 'total_questions': 1000,
+        'current_category': CATEGORIES[0]},
+    # GET /drinks-detail
+    '100 drinks': lambda: {'success': True, 'drinks': _drinks(100)},
+    # rows with types the encoders convert through default()
+    '1000 dated rows': lambda: {'rows': [{
+        'id': id, 'price': decimal.Decimal('4.50'),
+        'created': datetime.datetime(2020, 1, 1, 12, 30)}
+        for id in range(1000)]},
+}
+
+
+def _app(backend):
+    app = Flask(__name__)
+    app.config['JSON_BACKEND'] = backend
+    json_backend.init_json(app)
+    return app
+
+
+def main():
+    apps = {'stdlib': _app('json'), 'orjson': _app('orjson')}
+    print('{:<16} {:>9} {:>12} {:>12} {:>8}'.format(
+        'payload', 'bytes', 'stdlib us', 'orjson us', 'speedup'))
+    for name, payload in PAYLOADS.items():
+        data = payload()
+        timings = {}
+        for backend, app in apps.items():
+            with app.app_context():
+                try:
+                    size = len(jsonify(data).get_data())
+                except TypeError:  # Flask's encoder has no Decimal support
+                    timings[backend] = None
+                    continue
+                timer = timeit.Timer(lambda: jsonify(data))
+                number, _ = timer.autorange()
+                timings[backend] = min(timer.repeat(5, number)) / number
+        stdlib, fast = timings['stdlib'], timings['orjson']
+        print('{:<16} {:>9} {:>12} {:>12.1f} {:>8}'.format(
+            name, size,
+            '-' if stdlib is None else '{:.1f}'.format(stdlib * 1e6),
+            fast * 1e6,
+            '-' if stdlib is None else '{:.1f}x'.format(stdlib / fast)))
+
+
+if __name__ == '__main__':
+    main()
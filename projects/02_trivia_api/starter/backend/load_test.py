@@ -0,0 +1,163 @@
+'''
+Load test comparing the sync (flaskr) and async (asgi) serving modes.
+
+Opens --connections keep-alive HTTP/1.1 connections to each server in
+turn, sends the same mix of categories, questions, search and quiz
+requests on all of them for --duration seconds, and reports requests per
+second and latency percentiles for each. Only the standard library is
+needed. For example, with both servers on the same database:
+
+    gunicorn -w 4 --threads 64 -b :5000 'flaskr:create_app()'
+    hypercorn -w 4 -b :8000 'asgi:create_app()'
+    python load_test.py sync=http://localhost:5000 async=http://localhost:8000
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from urllib.parse import urlsplit
+
+# (method, path, JSON body) of the requests sent, in turn, on each connection
+REQUESTS = [
+    ('GET', '/categories', None),
+    ('GET', '/questions?page=1', None),
+    ('GET', '/questions?page=5', None),
+    ('GET', '/categories/2/questions', None),
+    ('POST', '/questions', {'searchTerm': 'title'}),
+    ('POST', '/quizzes',
+     {'quiz_category': {'id': 0}, 'previous_questions': [1, 2, 3]}),
+]
+
+
+def _request_bytes(host, method, path, body):
+    headers = ['{} {} HTTP/1.1'.format(method, path), 'Host: ' + host]
+    data = b''
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers += ['Content-Type: application/json',
+                    'Content-Length: {}'.format(len(data))]
+    return '\r\n'.join(headers).encode() + b'\r\n\r\n' + data
+
+
+async def _read_response(reader):
+    # Returns the status code and whether the connection can be reused
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.split(':', 1) for line in lines[1:] if ':' in line)
+    headers = {key.strip().lower(): value.strip()
+               for key, value in headers.items()}
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def _connection(url, requests, deadline, latencies, errors):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            request = next(requests)
+            started = time.perf_counter()
+            writer.write(request)
+            status, keep_alive = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 500:
+                errors[status] = errors.get(status, 0) + 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as error:
+            errors[type(error).__name__] = \
+                errors.get(type(error).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+                writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return float('nan')
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run(url, connections, duration, warmup):
+    '''
+    Runs the load against one server and returns its statistics.
+    '''
+    host = urlsplit(url).netloc
+    payloads = [_request_bytes(host, *request) for request in REQUESTS]
+
+    if warmup:
+        await _load(url, payloads, min(connections, 10), warmup)
+    latencies, errors, elapsed = await _load(
+        url, payloads, connections, duration)
+
+    ordered = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': _percentile(ordered, 0.50) * 1000,
+        'p99_ms': _percentile(ordered, 0.99) * 1000,
+        'max_ms': (ordered[-1] if ordered else float('nan')) * 1000,
+    }
+
+
+async def _load(url, payloads, connections, duration):
+    latencies, errors = [], {}
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*[
+        # Each connection starts at a different point of the mix
+        _connection(url, itertools.islice(
+            itertools.cycle(payloads), number % len(payloads), None),
+            deadline, latencies, errors)
+        for number in range(connections)])
+    return latencies, errors, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('servers', nargs='+', metavar='NAME=URL',
+                        help='servers to compare, e.g. sync=http://...')
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds of load per server')
+    parser.add_argument('--warmup', type=float, default=2,
+                        help='seconds of light load before measuring')
+    args = parser.parse_args()
+
+    print('{:<10} {:>10} {:>8} {:>10} {:>10} {:>10}  {}'.format(
+        'server', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'max ms',
+        'errors'))
+    for server in args.servers:
+        name, _, url = server.rpartition('=')
+        stats = asyncio.run(run(url, args.connections, args.duration,
+                                args.warmup))
+        print('{:<10} {:>10} {:>8.0f} {:>10.1f} {:>10.1f} {:>10.1f}  {}'
+              .format(name or url, stats['requests'],
+                      stats['requests_per_second'], stats['p50_ms'],
+                      stats['p99_ms'], stats['max_ms'],
+                      stats['errors'] or '-'))
+
+
+if __name__ == '__main__':
+    main()
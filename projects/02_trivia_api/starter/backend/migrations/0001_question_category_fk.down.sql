@@ -0,0 +1,13 @@
+-- Reverts 0001_question_category_fk.up.sql to the text category column
+-- created by the old model.
+--
+--   psql trivia < migrations/0001_question_category_fk.down.sql
+
+BEGIN;
+
+DROP INDEX IF EXISTS ix_questions_category_id;
+ALTER TABLE questions DROP CONSTRAINT IF EXISTS questions_category_fkey;
+ALTER TABLE questions DROP CONSTRAINT IF EXISTS category;
+ALTER TABLE questions ALTER COLUMN category TYPE varchar USING category::varchar;
+
+COMMIT;
@@ -0,0 +1,37 @@
+-- Makes questions.category an indexed integer foreign key to categories.id.
+--
+-- Databases created by db.create_all() from the old model store the
+-- category id as text; databases restored from trivia.psql already have the
+-- integer column and its foreign key, and only get the index.
+--
+--   psql trivia < migrations/0001_question_category_fk.up.sql
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'questions' AND column_name = 'category')
+            <> 'integer' THEN
+        UPDATE questions SET category = NULL WHERE category !~ '^\s*[0-9]+\s*$';
+        ALTER TABLE questions
+            ALTER COLUMN category TYPE integer USING trim(category)::integer;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                   WHERE conrelid = 'questions'::regclass AND contype = 'f') THEN
+        -- same rule as the foreign key: questions of a missing category
+        -- keep their row without a category
+        UPDATE questions SET category = NULL
+        WHERE category NOT IN (SELECT id FROM categories);
+        ALTER TABLE questions ADD CONSTRAINT questions_category_fkey
+            FOREIGN KEY (category) REFERENCES categories (id)
+            ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END $$;
+
+-- Serves category = ? filters, ordered by id or with id NOT IN (...), and
+-- the foreign key checks when a category is deleted
+CREATE INDEX IF NOT EXISTS ix_questions_category_id ON questions (category, id);
+
+COMMIT;
@@ -1,28 +1,80 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
-from flask_sqlalchemy import SQLAlchemy
+import time
+from contextlib import contextmanager
+from sqlalchemy import (Column, String, Integer, ForeignKey, Index,
+                        and_, create_engine, func, select, text)
+from replicas import SQLAlchemy, ReplicaSet, replica_binds
 import json
 
 database_name = "trivia"
 database_path = "postgres://Jonathan:jf@{}/{}".format(
     'localhost:5432', database_name)
 
+# Seconds an approximate question count is reused before asking again
+APPROXIMATE_COUNT_TTL = 60
+
+# Keys of Question.format() and Category.format(), in column order
+QUESTION_FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+CATEGORY_FIELDS = ('id', 'type')
+
 db = SQLAlchemy()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    the connection pool is configured from the DB_POOL_* settings of the
+    app config or the environment, see fsnd_common.pool
+    with replica_paths, reads go to those replicas and writes to
+    database_path, see replicas.py
 '''
 
 
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, replica_paths=()):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(replica_paths)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.extensions['replicas'] = (
+        ReplicaSet(app.config["SQLALCHEMY_BINDS"]) if replica_paths else None)
     db.app = app
     db.init_app(app)
     db.create_all()
 
 
+'''
+unit_of_work()
+    groups the insert(), update() and delete() calls made inside it into a
+    single transaction, committed when the block exits and rolled back if
+    it raises; nested blocks join the outermost one
+    EXAMPLE
+        with unit_of_work():
+            for question in questions:
+                question.insert()
+'''
+
+
+@contextmanager
+def unit_of_work():
+    session = db.session
+    depth = session.info.get('unit_of_work', 0)
+    session.info['unit_of_work'] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except BaseException:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info['unit_of_work'] = depth
+
+
+def _commit():
+    # Outside a unit of work every change is committed on its own
+    if not db.session.info.get('unit_of_work'):
+        db.session.commit()
+
+
 '''
 Question
 
@@ -35,9 +87,19 @@ class Question(db.Model):
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(Integer, ForeignKey(
+        'categories.id', onupdate='CASCADE', ondelete='SET NULL'))
     difficulty = Column(Integer)
 
+    # Category pages and quizzes filter on category and order or exclude
+    # by id; see migrations/ for existing databases
+    __table_args__ = (
+        Index('ix_questions_category_id', 'category', 'id'),
+    )
+
+    # (count, expiry) of the last approximate total
+    _approximate_total = (None, 0)
+
     def __init__(self, question, answer, category, difficulty):
         self.question = question
         self.answer = answer
@@ -46,23 +108,44 @@ class Question(db.Model):
 
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        _commit()
 
     def update(self):
-        db.session.commit()
+        _commit()
 
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
+        _commit()
+
+    @classmethod
+    def total(cls, approximate=False):
+        '''
+        Number of questions in the table.
+        With approximate=True PostgreSQL's planner estimate is used instead
+        of a full COUNT(*), cached for APPROXIMATE_COUNT_TTL seconds.
+        '''
+        if not approximate:
+            return db.session.query(func.count(cls.id)).scalar()
+
+        value, expires_at = cls._approximate_total
+        if value is not None and time.monotonic() < expires_at:
+            return value
+
+        value = None
+        if db.engine.dialect.name == 'postgresql':
+            value = db.session.execute(
+                text('SELECT reltuples::bigint FROM pg_class '
+                     'WHERE relname = :table'),
+                {'table': cls.__tablename__}).scalar()
+        if not value or value < 0:  # never analyzed
+            value = db.session.query(func.count(cls.id)).scalar()
+
+        cls._approximate_total = (
+            value, time.monotonic() + APPROXIMATE_COUNT_TTL)
+        return value
 
     def format(self):
-        return {
-            'id': self.id,
-            'question': self.question,
-            'answer': self.answer,
-            'category': self.category,
-            'difficulty': self.difficulty
-        }
+        return {field: getattr(self, field) for field in QUESTION_FIELDS}
 
 
 '''
@@ -81,7 +164,40 @@ class Category(db.Model):
         self.type = type
 
     def format(self):
-        return {
-            'id': self.id,
-            'type': self.type
-        }
+        return {field: getattr(self, field) for field in CATEGORY_FIELDS}
+
+
+'''
+select_questions(*criteria)
+    Core SELECT of the QUESTION_FIELDS columns of the questions matching
+    criteria, ordered by id; read-only listings format its rows with
+    format_question() instead of loading Question objects into the session
+
+select_question_categories()
+    Core SELECT of the id and category of every question, the rows the
+    quiz question index is built from
+
+format_question(row), format_category(row)
+    the format() dict of a row selected by a Core or async query, for
+    rows with the QUESTION_FIELDS or CATEGORY_FIELDS columns
+'''
+
+
+def select_questions(*criteria):
+    table = Question.__table__
+    return (select([table.c[field] for field in QUESTION_FIELDS])
+            .where(and_(*criteria))
+            .order_by(table.c.id))
+
+
+def select_question_categories():
+    table = Question.__table__
+    return select([table.c.id, table.c.category])
+
+
+def format_question(row):
+    return {field: row[field] for field in QUESTION_FIELDS}
+
+
+def format_category(row):
+    return {field: row[field] for field in CATEGORY_FIELDS}
@@ -0,0 +1,101 @@
+'''
+Benchmark of one page of GET /questions: paginate_questions() on the
+first page, on the last page with ?page (LIMIT/OFFSET) and with ?cursor
+(keyset), against loading and formatting the whole table and slicing the
+page in Python as the endpoint used to. Also times Question.total().
+Reports the mean of --repeat calls (--sliced-repeat for the sliced page),
+over --rows questions.
+
+    python pagination_benchmark.py --rows 1000000
+
+The questions are written to a temporary SQLite file unless a database
+URL is given, whose questions table is then used as it is.
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from flask import Flask, request
+
+from flaskr import QUESTIONS_PER_PAGE, paginate_questions
+from models import setup_db, db, Question, select_questions
+from rows_benchmark import seed
+
+
+def mean(function, repeat):
+    '''Mean time of repeat calls, in seconds, and the last result'''
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+        db.session.remove()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def sliced_page(page):
+    questions = [question.format() for question in
+                 Question.query.order_by(Question.id).all()]
+    start = (page - 1) * QUESTIONS_PER_PAGE
+    return questions[start:start + QUESTIONS_PER_PAGE]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('database_url', nargs='?')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    # the sliced listing loads the whole table: seconds per call at 1M rows
+    parser.add_argument('--sliced-repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    directory = None
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp()
+        database_url = 'sqlite:///' + os.path.join(directory, 'pages.db')
+    app = Flask(__name__)
+
+    def paginated(query_string):
+        with app.test_request_context('/questions?' + query_string):
+            return paginate_questions(request, select_questions())[0]
+
+    try:
+        setup_db(app, database_url)
+        with app.app_context():
+            if directory:
+                seed(args.rows)
+            total = Question.total()
+            last_page = max((total - 1) // QUESTIONS_PER_PAGE + 1, 1)
+            ids = [id for id, in db.session.query(Question.id).order_by(
+                Question.id).offset((last_page - 1) * QUESTIONS_PER_PAGE)
+                .limit(1)]
+            cursor = ids[0] - 1 if ids else 0
+            results = [
+                ('page 1', mean(lambda: paginated('page=1'), args.repeat)),
+                ('last page, ?page', mean(
+                    lambda: paginated('page={}'.format(last_page)),
+                    args.repeat)),
+                ('last page, ?cursor', mean(
+                    lambda: paginated('cursor={}'.format(cursor)),
+                    args.repeat)),
+                ('last page, sliced', mean(lambda: sliced_page(last_page),
+                                           args.sliced_repeat)),
+                ('Question.total()', mean(Question.total, args.repeat)),
+            ]
+            db.engine.dispose()
+    finally:
+        if directory:
+            shutil.rmtree(directory)
+
+    pages = [output for _, (output, _) in results[1:4]]
+    assert pages[0] == pages[1] == pages[2], 'the last pages differ'
+    print('{} questions, page {}, mean of {} ({} sliced)'.format(
+        total, last_page, args.repeat, args.sliced_repeat))
+    for name, (_, seconds) in results:
+        print('  {:20} {:10.2f} ms'.format(name, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+'''
+Load test of the connection pool when it is exhausted.
+
+Starts --threads threads that each check out a connection, hold it for
+--hold seconds with a SELECT 1, and give it back, --rounds times, against
+a pool of --pool-size connections plus --max-overflow. Reports how many
+checkouts succeeded and timed out, wait percentiles and the pool metrics
+served by GET /pool/metrics. For example, comparing a patient pool with
+one failing fast:
+
+    python pool_load_test.py --timeout 5
+    python pool_load_test.py --timeout 0.2
+
+The database defaults to a temporary SQLite file; pass a URL to load
+PostgreSQL instead.
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, exc, text
+
+from fsnd_common.pool import engine_options, pool_snapshot
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(share * len(values)), len(values) - 1)]
+
+
+def run(engine, threads, rounds, hold):
+    waits, failures = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker():
+        start.wait()
+        for _ in range(rounds):
+            started = time.perf_counter()
+            try:
+                connection = engine.connect()
+            except exc.TimeoutError:
+                with lock:
+                    failures.append(time.perf_counter() - started)
+                continue
+            with lock:
+                waits.append(time.perf_counter() - started)
+            try:
+                connection.execute(text('SELECT 1'))
+                time.sleep(hold)
+            finally:
+                connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return waits, failures, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('database_url', nargs='?')
+    parser.add_argument('--threads', type=int, default=24)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--hold', type=float, default=0.05,
+                        help='seconds each checkout keeps its connection')
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--max-overflow', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=5,
+                        help='DB_POOL_TIMEOUT, in seconds')
+    args = parser.parse_args()
+
+    directory = None
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp()
+        database_url = 'sqlite:///' + os.path.join(directory, 'pool.db')
+    engine = create_engine(database_url, **engine_options(database_url, {
+        'DB_POOL_SIZE': args.pool_size,
+        'DB_MAX_OVERFLOW': args.max_overflow,
+        'DB_POOL_TIMEOUT': args.timeout,
+    }))
+    try:
+        waits, failures, elapsed = run(
+            engine, args.threads, args.rounds, args.hold)
+        snapshot = pool_snapshot(engine.pool)
+    finally:
+        engine.dispose()
+        if directory:
+            shutil.rmtree(directory)
+
+    print('{} threads x {} rounds holding {:.0f} ms, pool {}+{}, '
+          'timeout {:g} s, {:.2f} s'.format(
+              args.threads, args.rounds, args.hold * 1000, args.pool_size,
+              args.max_overflow, args.timeout, elapsed))
+    print('  checkouts  {:5d}   timeouts {:5d}'.format(
+        len(waits), len(failures)))
+    if waits:
+        print('  wait       p50 {:.4f} s  p99 {:.4f} s  max {:.4f} s'.format(
+            percentile(waits, 0.5), percentile(waits, 0.99), max(waits)))
+    print('  pool       blocked {blocked}  timeouts {timeouts}  '
+          'wait max {wait_seconds_max:.4f} s'.format(**snapshot))
+    for bucket in snapshot['checkout_latency']:
+        print('    <= {!s:>6}  {}'.format(bucket['le'], bucket['count']))
+
+
+if __name__ == '__main__':
+    main()
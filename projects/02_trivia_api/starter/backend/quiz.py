@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Question, select_question_categories
+
+# Seconds the id index is trusted before it is rebuilt from the database
+QUESTION_INDEX_TTL = 300
+# Random draws tried before falling back to scanning the unplayed ids
+MAX_DRAWS = 8
+
+
+class QuestionIndex:
+    '''
+    In-memory index of question ids per category, used to pick quiz
+    questions without sending the list of played ids to the database.
+
+    The index is rebuilt on first use after a question is inserted or
+    deleted in this process, and at least every QUESTION_INDEX_TTL
+    seconds to pick up changes made by other processes.
+    '''
+
+    def __init__(self, ttl=QUESTION_INDEX_TTL):
+        self.ttl = ttl
+        self._ids = {}
+        self._expires_at = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._generation += 1
+        self._expires_at = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def is_stale(self):
+        return time.monotonic() >= self._expires_at
+
+    def ids(self, category=None):
+        '''
+        Ids of the questions in the given category, or of all questions
+        when category is None.
+        '''
+        if self.is_stale():
+            self._rebuild()
+        return self._ids.get(None if category is None else int(category), [])
+
+    def _rebuild(self):
+        with self._lock:
+            if not self.is_stale():
+                return
+            generation = self._generation
+            # From the primary, like the category cache: a lagging replica
+            # would leave out the question whose insert invalidated us
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    select_question_categories()).fetchall()
+            self.load(rows, generation)
+
+    def load(self, rows, generation):
+        '''
+        Rebuilds the index from (id, category) rows, read after `generation`
+        was current. Callers that do not hold the lock (the async app)
+        must not load concurrently.
+        '''
+        ids = {None: []}
+        for question_id, category in rows:
+            ids[None].append(question_id)
+            if category is not None:
+                ids.setdefault(category, []).append(question_id)
+        self._ids = ids
+        # An invalidation during the query means ids may be stale already
+        if generation == self._generation:
+            self._expires_at = time.monotonic() + self.ttl
+
+    def sample(self, category=None, exclude=()):
+        '''
+        Returns a random question id from the category that is not in
+        exclude, or None once every question has been played.
+        '''
+        ids = self.ids(category)
+        if not ids:
+            return None
+        exclude = set(exclude)
+
+        # While most of the pool is unplayed a few draws are enough, so the
+        # cost does not depend on the size of the pool or of the history.
+        for _ in range(MAX_DRAWS):
+            question_id = random.choice(ids)
+            if question_id not in exclude:
+                return question_id
+
+        remaining = [i for i in ids if i not in exclude]
+        return random.choice(remaining) if remaining else None
+
+
+question_index = QuestionIndex()
+
+
+def random_question(category=None, previous_questions=()):
+    '''
+    Returns a random Question from the category (all categories when
+    category is None) that is not in previous_questions, or None.
+    '''
+    question_id = question_index.sample(category, previous_questions)
+    if question_id is None:
+        return None
+
+    question = Question.query.get(question_id)
+    if question is None:
+        # Deleted by another process since the index was built
+        question_index.invalidate()
+        question_id = question_index.sample(category, previous_questions)
+        question = Question.query.get(question_id) if question_id else None
+    return question
+
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_delete')
+@event.listens_for(Question, 'after_update')
+def _question_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['questions_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_question_index(session):
+    if session.info.pop('questions_changed', False):
+        question_index.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_question_changes(session):
+    session.info.pop('questions_changed', None)
@@ -0,0 +1,93 @@
+'''
+Benchmark of picking the next quiz question in one category: the query
+POST /quizzes used to run, a NOT IN over the played ids, against
+random_question() drawing from the in-memory QuestionIndex. Reports the
+mean of --repeat picks for each --history size of played ids, over
+--rows questions all in the quiz category.
+
+    python quiz_benchmark.py --rows 100000 --history 0 1000 10000
+
+The questions are written to a temporary SQLite file.
+'''
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from flask import Flask
+
+from models import setup_db, db, Question, Category
+from quiz import question_index, random_question
+
+CATEGORY = 1
+
+
+def seed(rows):
+    db.session.execute(Category.__table__.insert(),
+                       [{'id': CATEGORY, 'type': 'Science'}])
+    db.session.execute(Question.__table__.insert(), [{
+        'question': 'Question number {}?'.format(n),
+        'answer': 'Answer {}'.format(n),
+        'category': CATEGORY,
+        'difficulty': n % 5 + 1,
+    } for n in range(rows)])
+    db.session.commit()
+
+
+def mean(function, repeat):
+    '''Mean time of repeat calls, in seconds'''
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def not_in_question(previous_questions):
+    return Question.query.filter(
+        Question.id.notin_(previous_questions),
+        Question.category == CATEGORY).first()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--history', type=int, nargs='+',
+                        default=[0, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    app = Flask(__name__)
+    results = []
+    try:
+        setup_db(app, 'sqlite:///' + os.path.join(directory, 'quiz.db'))
+        with app.app_context():
+            seed(args.rows)
+            question_index.invalidate()
+            ids = question_index.ids(CATEGORY)
+            for history in args.history:
+                previous = random.sample(ids, min(history, len(ids)))
+                played = set(previous)
+                assert random_question(CATEGORY, previous).id not in played
+                results.append((history, mean(
+                    lambda: not_in_question(previous), args.repeat), mean(
+                    lambda: random_question(CATEGORY, previous),
+                    args.repeat)))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+    print('{} questions, mean of {}'.format(args.rows, args.repeat))
+    print('  {:>8} {:>12} {:>18}'.format(
+        'played', 'NOT IN', 'random_question()'))
+    for history, old, new in results:
+        print('  {:8d} {:9.2f} ms {:15.2f} ms'.format(
+            history, old * 1000, new * 1000))
+
+
+if __name__ == '__main__':
+    main()
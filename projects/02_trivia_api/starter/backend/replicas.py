@@ -0,0 +1,152 @@
+import itertools
+import threading
+import time
+
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, orm, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+from fsnd_common import pool
+
+# Seconds a replica's health check result is trusted
+REPLICA_CHECK_INTERVAL = 10
+# Seconds a request waits for the first check of a replica
+REPLICA_CHECK_TIMEOUT = 0.5
+
+
+def replica_binds(replica_paths):
+    '''
+    SQLALCHEMY_BINDS entries for the given replica database URLs.
+    '''
+    return {'replica_{}'.format(number): path
+            for number, path in enumerate(replica_paths)}
+
+
+class ReplicaSet:
+    '''
+    Round-robin choice among the replica binds that pass a health check.
+
+    A replica is checked with SELECT 1 at most every REPLICA_CHECK_INTERVAL
+    seconds, in a background thread so that requests keep the last result
+    meanwhile; only the first check of a replica is waited for, up to
+    REPLICA_CHECK_TIMEOUT seconds, after which it counts as down until the
+    check answers. A replica is marked down at once when a query on it
+    loses its connection. When no replica is healthy reads go to the
+    primary.
+    '''
+
+    def __init__(self, keys, check_interval=REPLICA_CHECK_INTERVAL,
+                 check_timeout=REPLICA_CHECK_TIMEOUT):
+        self.keys = list(keys)
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._health = {}  # key -> (healthy, checked at)
+        self._checks = {}  # key -> running check thread
+        self._watched = set()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def choose(self, get_engine):
+        '''
+        Engine of the next healthy replica, or None.
+        '''
+        for _ in self.keys:
+            key = self.keys[next(self._counter) % len(self.keys)]
+            engine = self._engine(key, get_engine)
+            if self._is_healthy(key, engine):
+                return engine
+        return None
+
+    def mark_down(self, key):
+        self._health[key] = (False, time.monotonic())
+
+    def _engine(self, key, get_engine):
+        engine = get_engine(key)
+        with self._lock:
+            if engine not in self._watched:
+                self._watched.add(engine)
+
+                @event.listens_for(engine, 'handle_error')
+                def _on_error(context):
+                    if context.is_disconnect:
+                        self.mark_down(key)
+        return engine
+
+    def _is_healthy(self, key, engine):
+        healthy, checked_at = self._health.get(key, (None, None))
+        if (checked_at is None or
+                time.monotonic() - checked_at >= self.check_interval):
+            check = self._start_check(key, engine)
+            if healthy is None:
+                check.join(self.check_timeout)
+                # Still unanswered: down until the check says otherwise
+                healthy, _ = self._health.setdefault(
+                    key, (False, time.monotonic()))
+        return healthy
+
+    def _start_check(self, key, engine):
+        with self._lock:
+            check = self._checks.get(key)
+            if check is None or not check.is_alive():
+                check = threading.Thread(target=self._check,
+                                         args=(key, engine), daemon=True)
+                self._checks[key] = check
+                check.start()
+        return check
+
+    def _check(self, key, engine):
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            healthy = True
+        except SQLAlchemyError:
+            healthy = False
+        self._health[key] = (healthy, time.monotonic())
+
+
+def _is_write(clause):
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        words = clause.text.split(None, 1)
+        return not words or words[0].upper() not in ('SELECT', 'WITH')
+    return False
+
+
+class RoutingSession(SignallingSession):
+    '''
+    Session that reads from a replica and writes to the primary.
+
+    Each session sticks to the replica it first reads from. Once it has
+    written, every later statement goes to the primary, so a request
+    always reads its own writes.
+    '''
+
+    def get_bind(self, mapper=None, clause=None):
+        primary = super().get_bind(mapper, clause)
+        replicas = self.app.extensions.get('replicas')
+        if not replicas:
+            return primary
+
+        if self._flushing or _is_write(clause):
+            self.info['wrote'] = True
+        if self.info.get('wrote'):
+            return primary
+
+        if 'replica' not in self.info:
+            state = self.app.extensions['sqlalchemy']
+            self.info['replica'] = replicas.choose(
+                lambda key: state.db.get_engine(self.app, bind=key))
+        return self.info['replica'] or primary
+
+
+class SQLAlchemy(pool.SQLAlchemy):
+    '''
+    pool.SQLAlchemy with sessions that route reads to the replicas set up
+    by setup_db().
+    '''
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
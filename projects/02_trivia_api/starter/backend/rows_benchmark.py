@@ -0,0 +1,105 @@
+'''
+Benchmark of building the question listing from ORM objects with
+Question.format() and from Core rows with select_questions() and
+format_question(): best time of --repeat runs and tracemalloc peak, over
+--rows questions.
+
+    python rows_benchmark.py --rows 10000
+
+The questions are written to a temporary SQLite file unless a database
+URL is given, whose questions and categories tables are then used as
+they are. Both paths must give the same output.
+'''
+import argparse
+import gc
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from flask import Flask
+
+from models import (setup_db, db, Question, Category, select_questions,
+                    format_question)
+
+
+def seed(rows):
+    db.session.execute(Category.__table__.insert(), [
+        {'id': id, 'type': type} for id, type in enumerate(
+            ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+             'Sports'], 1)])
+    db.session.execute(Question.__table__.insert(), [{
+        'question': 'Question number {} about topic {}?'.format(n, n % 97),
+        'answer': 'Answer {}'.format(n),
+        'category': n % 6 + 1,
+        'difficulty': n % 5 + 1,
+    } for n in range(rows)])
+    db.session.commit()
+
+
+def measure(function, repeat):
+    '''Best time of repeat calls, in seconds, and peak memory, in bytes'''
+    function()
+    db.session.remove()
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+        db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    output = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.remove()
+    return output, best, peak
+
+
+def orm_listing():
+    return [question.format() for question in
+            Question.query.order_by(Question.id).all()]
+
+
+def core_listing():
+    return [format_question(row) for row in
+            db.session.execute(select_questions())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('database_url', nargs='?')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = None
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp()
+        database_url = 'sqlite:///' + os.path.join(directory, 'rows.db')
+    app = Flask(__name__)
+    try:
+        setup_db(app, database_url)
+        with app.app_context():
+            if directory:
+                seed(args.rows)
+            orm, orm_seconds, orm_peak = measure(orm_listing, args.repeat)
+            core, core_seconds, core_peak = measure(core_listing, args.repeat)
+            db.engine.dispose()
+    finally:
+        if directory:
+            shutil.rmtree(directory)
+
+    assert orm == core, 'the two listings differ'
+    print('{} questions, best of {}'.format(len(core), args.repeat))
+    for name, seconds, peak in (('ORM format()', orm_seconds, orm_peak),
+                                ('Core format_question()', core_seconds,
+                                 core_peak)):
+        print('  {:24} {:8.1f} ms  peak {:6.1f} MB'.format(
+            name, seconds * 1000, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
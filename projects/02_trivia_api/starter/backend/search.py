@@ -0,0 +1,156 @@
+from sqlalchemy import column, event, func, or_, select, table, text
+from sqlalchemy.exc import DBAPIError
+
+from models import db, Question, QUESTION_FIELDS, format_question
+
+# Shortest term the trigram indexes can look up
+MIN_INDEXED_TERM_LENGTH = 3
+
+# Whether pg_trgm is installed, so results can be ranked by similarity
+_has_trigram = False
+# URLs of the SQLite databases known to have the questions_fts index
+_sqlite_indexed = set()
+
+# Query returning a row when the dialect's search index exists
+SEARCH_INDEX_EXISTS = {
+    'postgresql': "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'",
+    'sqlite': "SELECT 1 FROM sqlite_master WHERE name = 'questions_fts'",
+}
+
+questions_fts = table('questions_fts', column('rowid'), column('rank'))
+
+# PostgreSQL: trigram GIN indexes let ILIKE '%term%' on both columns use an
+# index scan instead of reading the whole table.
+POSTGRES_INDEX = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_questions_question_trgm '
+    'ON questions USING gin (question gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_questions_answer_trgm '
+    'ON questions USING gin (answer gin_trgm_ops)',
+]
+
+# SQLite: an FTS5 table with the trigram tokenizer, kept in sync with the
+# questions table by triggers, gives the same substring semantics.
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE questions_fts USING fts5("
+    "question, answer, content='questions', content_rowid='id', "
+    "tokenize='trigram')",
+    "CREATE TRIGGER questions_fts_insert AFTER INSERT ON questions BEGIN "
+    "INSERT INTO questions_fts(rowid, question, answer) "
+    "VALUES (new.id, new.question, new.answer); END",
+    "CREATE TRIGGER questions_fts_delete AFTER DELETE ON questions BEGIN "
+    "INSERT INTO questions_fts(questions_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); END",
+    "CREATE TRIGGER questions_fts_update AFTER UPDATE ON questions BEGIN "
+    "INSERT INTO questions_fts(questions_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "INSERT INTO questions_fts(rowid, question, answer) "
+    "VALUES (new.id, new.question, new.answer); END",
+    "INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')",
+]
+
+
+def create_search_index(connection):
+    '''
+    Creates the search index for the connection's database if it is
+    missing. Safe to call on every start-up.
+
+    When the index cannot be created (no permission to install pg_trgm,
+    SQLite older than 3.34) search still works, with a sequential scan.
+    '''
+    global _has_trigram
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        try:
+            with connection.begin_nested():
+                for statement in POSTGRES_INDEX:
+                    connection.execute(text(statement))
+            _has_trigram = True
+        except DBAPIError:
+            pass
+
+    elif dialect == 'sqlite':
+        if not _has_sqlite_index(connection):
+            try:
+                for statement in SQLITE_INDEX:
+                    connection.execute(text(statement))
+            except DBAPIError:
+                return
+        _sqlite_indexed.add(str(connection.engine.url))
+
+
+def drop_search_index(connection):
+    if connection.dialect.name == 'sqlite':
+        _sqlite_indexed.discard(str(connection.engine.url))
+        connection.execute(text('DROP TABLE IF EXISTS questions_fts'))
+
+
+def _has_sqlite_index(connection):
+    return connection.execute(
+        text(SEARCH_INDEX_EXISTS['sqlite'])).scalar() is not None
+
+
+event.listen(Question.__table__, 'after_create',
+             lambda target, connection, **kw: create_search_index(connection))
+event.listen(Question.__table__, 'before_drop',
+             lambda target, connection, **kw: drop_search_index(connection))
+
+
+def search_statements(term, page=1, per_page=10, dialect='postgresql',
+                      indexed=False):
+    '''
+    Core statements for a search: one counting the questions whose
+    question or answer contains term (case-insensitive), one selecting the
+    QUESTION_FIELDS of a page of them, best matches first.
+
+    indexed tells whether the dialect's search index exists (see
+    SEARCH_INDEX_EXISTS). Shared by the sync and the async app.
+    '''
+    questions = Question.__table__
+    columns = [questions.c[field] for field in QUESTION_FIELDS]
+    offset = (max(page, 1) - 1) * per_page
+
+    if (dialect == 'sqlite' and indexed and
+            len(term) >= MIN_INDEXED_TERM_LENGTH):
+        match = text('questions_fts MATCH :match').bindparams(
+            match='"{}"'.format(term.replace('"', '""')))
+        total = select([func.count()]).select_from(questions_fts).where(match)
+        rows = (select(columns)
+                .select_from(questions.join(
+                    questions_fts, questions_fts.c.rowid == questions.c.id))
+                .where(match)
+                .order_by(questions_fts.c.rank))
+        return total, rows.limit(per_page).offset(offset)
+
+    pattern = '%{}%'.format(
+        term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+    condition = or_(questions.c.question.ilike(pattern, escape='\\'),
+                    questions.c.answer.ilike(pattern, escape='\\'))
+    total = select([func.count()]).select_from(questions).where(condition)
+    rows = select(columns).where(condition)
+
+    if dialect == 'postgresql' and indexed:
+        rank = func.greatest(func.similarity(questions.c.question, term),
+                             func.similarity(questions.c.answer, term))
+        rows = rows.order_by(rank.desc(), questions.c.id)
+    else:
+        rows = rows.order_by(questions.c.id)
+    return total, rows.limit(per_page).offset(offset)
+
+
+def search_questions(term, page=1, per_page=10):
+    '''
+    Returns one page of the formatted questions whose question or answer
+    contains term (case-insensitive), best matches first, and the number
+    of matches.
+    '''
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        # Known from create_search_index(), run at start-up, rather than
+        # looked up in sqlite_master on every search
+        indexed = str(db.engine.url) in _sqlite_indexed
+    else:
+        indexed = _has_trigram
+    total, rows = search_statements(term, page, per_page, dialect, indexed)
+    return ([format_question(row) for row in db.session.execute(rows)],
+            db.session.execute(total).scalar())
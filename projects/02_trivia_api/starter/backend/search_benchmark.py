@@ -0,0 +1,85 @@
+'''
+Benchmark of question search: the ILIKE '%term%' scan of the question
+text that POST /questions used to run, loading every match, against
+search_questions(), which reads one page through the search index (FTS5
+on SQLite, pg_trgm on PostgreSQL). Reports the mean of --repeat searches
+for each of --terms, over --rows questions.
+
+    python search_benchmark.py --rows 1000000
+
+The questions are written to a temporary SQLite file unless a database
+URL is given, whose questions table is then used as it is.
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from flask import Flask
+
+from models import setup_db, db, Question
+from rows_benchmark import seed
+from search import search_questions
+
+# A term matching about 1% of the seeded questions, one matching a single
+# answer, and one matching nothing
+TERMS = ['topic 42?', 'Answer 99999', 'zzz']
+
+
+def mean(function, repeat):
+    '''Mean time of repeat calls, in seconds, and the last result'''
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+        db.session.remove()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def ilike_scan(term):
+    return Question.query.filter(
+        Question.question.ilike('%{}%'.format(term))).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('database_url', nargs='?')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--terms', nargs='+', default=TERMS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = None
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp()
+        database_url = 'sqlite:///' + os.path.join(directory, 'search.db')
+    app = Flask(__name__)
+    results = []
+    try:
+        setup_db(app, database_url)
+        with app.app_context():
+            if directory:
+                seed(args.rows)
+            total = Question.total()
+            for term in args.terms:
+                (_, matches), indexed = mean(
+                    lambda: search_questions(term), args.repeat)
+                _, scan = mean(lambda: ilike_scan(term), args.repeat)
+                results.append((term, matches, scan, indexed))
+            db.engine.dispose()
+    finally:
+        if directory:
+            shutil.rmtree(directory)
+
+    print('{} questions, mean of {}'.format(total, args.repeat))
+    print('  {:16} {:>8} {:>12} {:>20}'.format(
+        'term', 'matches', 'ILIKE', 'search_questions()'))
+    for term, matches, scan, indexed in results:
+        print('  {:16} {:8d} {:9.1f} ms {:17.1f} ms'.format(
+            repr(term), matches, scan * 1000, indexed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,38 @@
+import asyncio
+import gzip
 import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, event
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import (setup_db, unit_of_work, db, Question, Category,
+                    select_questions, select_question_categories,
+                    format_question)
+from categories import category_cache
+from bulk import import_questions
+from search import search_questions
+from quiz import question_index
+from replicas import ReplicaSet
+from fsnd_common.pool import InstrumentedQueuePool
+from fsnd_common.query_budget import (
+    QueryBudgetTestMixin, QueryBudgetExceeded, count_queries, query_budget)
 
+try:
+    import asgi
+except ImportError:  # requirements-async.txt is optional
+    asgi = None
 
-class TriviaTestCase(unittest.TestCase):
+MONITORING_TOKEN = 'monitoring-token'
+MONITORING_HEADERS = {'Authorization': 'Bearer ' + MONITORING_TOKEN}
+
+
+class TriviaTestCase(QueryBudgetTestMixin, unittest.TestCase):
     """This class represents the trivia test case"""
 
     def setUp(self):
@@ -31,7 +56,9 @@ class TriviaTestCase(unittest.TestCase):
         pass
 
     def test_get_categories(self):
-        res = self.client().get('/categories')
+        category_cache.invalidate()
+        with self.assertQueryBudget():
+            res = self.client().get('/categories')
         data = json.loads(res.data)
 
         self.assertEqual(res.status_code, 200)
@@ -39,13 +66,121 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['categories'])
         self.assertTrue(data['total_categories'])
 
+    def test_categories_served_from_cache(self):
+        self.client().get('/categories')
+        misses = category_cache.misses
+
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['categories'])
+        self.assertEqual(category_cache.misses, misses)
+
+    def test_404_sent_missing_category(self):
+        res = self.client().get('/categories/1000/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_questions_gzipped(self):
+        res = self.client().get('/questions',
+                                headers={'Accept-Encoding': 'gzip'})
+        data = json.loads(gzip.decompress(res.data))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(data['success'], True)
+
+    def test_304_sent_when_etag_matches(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+
+        res = self.client().get('/categories',
+                                headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        self.assertEqual(res.headers['ETag'], etag)
+
+    def test_304_sent_before_the_view_runs(self):
+        res = self.client().get('/questions?page=1',
+                                headers={'Accept-Encoding': 'gzip'})
+        etag = res.headers['ETag']
+
+        with count_queries() as log:
+            res = self.client().get('/questions?page=1', headers={
+                'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['ETag'], etag)
+        self.assertEqual(log.count(), 0)
+
+    def test_etag_changes_with_the_data(self):
+        etag = self.client().get('/questions').headers['ETag']
+        self.assertNotEqual(
+            self.client().get('/questions?page=2').headers['ETag'], etag)
+
+        with self.app.app_context():
+            Question('Changes the ETag?', 'Yes', 1, 1).insert()
+        res = self.client().get('/questions', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
     def test_get_paginated_questions(self):
-        res = self.client().get('/questions?page=2')
+        with self.assertQueryBudget():
+            res = self.client().get('/questions?page=2')
         data = json.loads(res.data)
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertTrue(data['total_questions'])
 
+    def test_get_questions_cold_within_budget(self):
+        # approximate total and category cache both to be loaded
+        self.app.config['APPROXIMATE_TOTAL_QUESTIONS'] = True
+        Question._approximate_total = (None, 0)
+        self.addCleanup(setattr, Question, '_approximate_total', (None, 0))
+        category_cache.invalidate()
+
+        with self.assertQueryBudget():
+            res = self.client().get('/questions')
+            create = self.client().post('/questions', json={
+                'question': 'Within budget?', 'answer': 'Yes',
+                'category': 1, 'difficulty': 1})
+            search = self.client().post('/questions',
+                                        json={'searchTerm': 'budget'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['total_questions'],
+                         Question.query.count() - 1)
+        self.assertEqual(create.status_code, 200)
+        self.assertTrue(json.loads(search.data)['total_questions'])
+
+    def test_get_questions_by_cursor(self):
+        res = self.client().get('/questions?page=1')
+        first_page = json.loads(res.data)
+
+        res = self.client().get(
+            '/questions?cursor={}'.format(first_page['questions'][4]['id']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['questions'][:5], first_page['questions'][5:])
+        self.assertEqual(data['total_questions'],
+                         first_page['total_questions'])
+
+    def test_get_questions_past_last_page(self):
+        res = self.client().get('/questions?page=1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'], [])
+        self.assertEqual(data['next_cursor'], None)
+
     def test_404_sent_invalid_category_id(self):
         res = self.client().get('/categories/-1/questions')
         data = json.loads(res.data)
@@ -64,11 +199,52 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
 
+    def test_search_questions(self):
+        with self.assertQueryBudget():
+            res = self.client().post('/questions',
+                                     json={'searchTerm': 'TITLE'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['total_questions'])
+        for question in data['questions']:
+            self.assertIn('title', question['question'].lower())
+
+    def test_search_does_not_look_up_the_index(self):
+        with self.app.app_context(), count_queries() as log:
+            search_questions('title')
+        statements = [statement for _, _, statement in log.statements]
+
+        self.assertEqual(len(statements), 2)
+        self.assertFalse([statement for statement in statements
+                          if 'sqlite_master' in statement])
+        if db.engine.dialect.name == 'sqlite':
+            self.assertIn('questions_fts', statements[0])
+
+    def test_search_questions_matches_answer(self):
+        self.client().post('/questions',
+                           json={
+                               "question": "Which organ filters the blood?",
+                               "answer": "Kidneyquux",
+                               "category": 1,
+                               "difficulty": 2, })
+
+        res = self.client().post('/questions',
+                                 json={'searchTerm': 'neyQUU'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Kidneyquux',
+                      [question['answer'] for question in data['questions']])
+
     def test_delete_question(self):
         last_added_question = Question.query.order_by(
             Question.id.desc()).first()
 
-        res = self.client().delete('/questions/'+str(last_added_question.id))
+        with self.assertQueryBudget():
+            res = self.client().delete(
+                '/questions/'+str(last_added_question.id))
 
         data = json.loads(res.data)
         self.assertEqual(res.status_code, 200)
@@ -84,13 +260,493 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 404)
         self.assertEqual(data['success'], False)
 
+    def test_import_questions(self):
+        lines = [
+            {'question': 'Imported question?', 'answer': 'Yes',
+             'category': 1, 'difficulty': 2},
+            {'question': 'Another one?', 'answer': 'No',
+             'category': '1', 'difficulty': '3'},
+            {'question': 'Bad category?', 'answer': 'No',
+             'category': 1000, 'difficulty': 1},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines) + '\n{oops\n'
+        total = Question.query.count()
+
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['imported'], 2)
+        self.assertEqual(data['rejected'], 2)
+        self.assertEqual([error['line'] for error in data['errors']], [3, 4])
+        self.assertEqual(Question.query.count(), total + 2)
+
+    def test_import_joins_unit_of_work(self):
+        row = {'question': 'Rolled back?', 'answer': 'Yes',
+               'category': 1, 'difficulty': 1}
+        total = Question.query.count()
+
+        with self.assertRaises(RuntimeError):
+            with unit_of_work():
+                report = import_questions([(1, row)])
+                self.assertEqual(report['imported'], 1)
+                self.assertEqual(Question.query.count(), total + 1)
+                raise RuntimeError('abandon the import')
+
+        self.assertEqual(Question.query.count(), total)
+
+    def test_import_rejects_non_integer_difficulty(self):
+        lines = [
+            {'question': 'Boolean?', 'answer': 'No',
+             'category': 1, 'difficulty': True},
+            {'question': 'Fraction?', 'answer': 'No',
+             'category': 1, 'difficulty': 2.7},
+            {'question': 'Word?', 'answer': 'No',
+             'category': 1, 'difficulty': 'two'},
+            {'question': 'Whole float?', 'answer': 'Yes',
+             'category': 1, 'difficulty': 2.0},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines)
+
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['imported'], 1)
+        self.assertEqual(data['errors'], [
+            {'line': line, 'error': 'difficulty must be an integer'}
+            for line in (1, 2, 3)])
+
+    def test_export_questions(self):
+        res = self.client().get('/questions/export')
+        rows = [json.loads(line) for line in res.data.splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(rows), Question.query.count())
+        self.assertEqual(rows[0], Question.query.order_by(
+            Question.id).first().format())
+
+    def test_export_questions_csv(self):
+        res = self.client().get('/questions/export?format=csv')
+        lines = res.data.decode().splitlines()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(lines[0], 'id,question,answer,category,difficulty')
+        self.assertEqual(len(lines), Question.query.count() + 1)
+
+    def test_select_questions_matches_format(self):
+        with self.app.app_context():
+            rows = db.session.execute(select_questions(Question.category == 1))
+            formatted = [format_question(row) for row in rows]
+            questions = Question.query.filter(
+                Question.category == 1).order_by(Question.id)
+
+            self.assertTrue(formatted)
+            self.assertEqual(formatted,
+                             [question.format() for question in questions])
+
+    def test_unit_of_work_commits_once(self):
+        total = Question.query.count()
+
+        with unit_of_work() as session:
+            for number in range(3):
+                Question('Batched {}?'.format(number), 'Yes', 1, 1).insert()
+                # nothing is committed until the block exits
+                self.assertTrue(session.new)
+
+        self.assertEqual(Question.query.count(), total + 3)
+
+    def test_unit_of_work_rolls_back_on_error(self):
+        total = Question.query.count()
+
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                Question('Rolled back?', 'Yes', 1, 1).insert()
+                raise ValueError
+
+        self.assertEqual(Question.query.count(), total)
+
+    def test_get_pool_metrics(self):
+        self.app.config['MONITORING_TOKEN'] = MONITORING_TOKEN
+        self.client().get('/questions')
+        res = self.client().get('/pool/metrics', headers=MONITORING_HEADERS)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['binds'], {})
+        with self.app.app_context():
+            pool = db.engine.pool
+        self.assertEqual(data['pool'], type(pool).__name__)
+        if not isinstance(pool, InstrumentedQueuePool):
+            # e.g. in-memory SQLite, which keeps its single connection
+            return
+        self.assertTrue(data['checkouts'])
+        self.assertEqual(data['waiting'], 0)
+        self.assertEqual(data['checkout_latency'][-1]['le'], '+Inf')
+        self.assertEqual(data['checkout_latency'][-1]['count'],
+                         data['checkouts'])
+
+    def test_401_pool_metrics_without_token(self):
+        self.app.config['MONITORING_TOKEN'] = MONITORING_TOKEN
+        res = self.client().get('/pool/metrics', headers={
+            'Authorization': 'Bearer wrong-token'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(data['success'], False)
+
+    def test_404_pool_metrics_without_monitoring_token(self):
+        res = self.client().get('/pool/metrics', headers=MONITORING_HEADERS)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_repeated_statements_grouped(self):
+        with count_queries() as log:
+            for question in Question.query.limit(3).all():
+                Category.query.filter_by(id=question.category).first()
+
+        self.assertEqual(log.count(), 4)
+        statement, times = log.repeated()[0]
+        self.assertEqual(times, 3)
+        self.assertIn('categories', statement)
+
+    def test_query_budget_exceeded_fails_request(self):
+        app = create_app({'QUERY_BUDGET_MODE': 'fail', 'TESTING': True})
+        setup_db(app, self.database_path)
+
+        @app.route('/n-plus-one')
+        @query_budget(2)
+        def n_plus_one():
+            return json.dumps([
+                Category.query.filter_by(id=question.category).first().type
+                for question in Question.query.limit(5).all()])
+
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            app.test_client().get('/n-plus-one')
+        self.assertIn('n_plus_one ran 6 SQL statements, over its budget of 2',
+                      str(raised.exception))
+        self.assertIn('5x SELECT', str(raised.exception))
+
+    def test_stdlib_json_backend_gives_same_json(self):
+        app = create_app({'JSON_BACKEND': 'json'})
+        setup_db(app, self.database_path)
+        res = app.test_client().get('/questions')
+
+        self.assertIsNot(app.json_encoder, self.app.json_encoder)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data),
+                         json.loads(self.client().get('/questions').data))
+
+    def metrics_app(self, **config):
+        profiles = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profiles)
+        app = create_app(dict({
+            'METRICS_ENABLED': True,
+            'METRICS_PROFILE_DIR': profiles,
+            'MONITORING_TOKEN': MONITORING_TOKEN,
+        }, **config))
+        setup_db(app, self.database_path)
+        return app
+
+    def test_get_metrics(self):
+        app = self.metrics_app(METRICS_PROFILE_RATE=1, METRICS_SLOW_REQUEST=0)
+        client = app.test_client()
+        client.get('/questions')
+
+        res = client.get('/metrics')
+        text = res.get_data(as_text=True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('http_request_duration_seconds_count{endpoint='
+                      '"get_questions",method="GET",status="200"} 1', text)
+        self.assertIn('sql_statements_total{endpoint="get_questions"}', text)
+
+        res = client.get('/metrics/profiles', headers=MONITORING_HEADERS)
+        data = json.loads(res.data)
+
+        self.assertTrue(data['profiles'])
+        self.assertIn('get_questions', data['profiles'][0])
+        res = client.get('/metrics/profiles/' + data['profiles'][0],
+                         headers=MONITORING_HEADERS)
+        res.close()
+        self.assertEqual(res.status_code, 200)
+
+    def test_401_metrics_profiles_without_token(self):
+        client = self.metrics_app().test_client()
+
+        self.assertEqual(client.get('/metrics/profiles').status_code, 401)
+
+    def test_streamed_response_recorded_on_close(self):
+        client = self.metrics_app().test_client()
+        count = ('http_request_duration_seconds_count{endpoint='
+                 '"bulk_export",method="GET",status="200"} 1')
+
+        res = client.get('/questions/export')
+        self.assertNotIn(count, client.get('/metrics').get_data(as_text=True))
+        res.get_data()
+        res.close()
+
+        self.assertIn(count, client.get('/metrics').get_data(as_text=True))
+
+    def test_404_metrics_disabled(self):
+        res = self.client().get('/metrics')
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_503_when_pool_exhausted(self):
+        app = create_app({'DB_POOL_SIZE': 2, 'DB_MAX_OVERFLOW': 0,
+                          'DB_POOL_TIMEOUT': 0.2,
+                          'MONITORING_TOKEN': MONITORING_TOKEN})
+        setup_db(app, self.database_path)
+        with app.app_context():
+            held = [db.engine.connect() for _ in range(2)]
+            timeouts = json.loads(app.test_client().get(
+                '/pool/metrics', headers=MONITORING_HEADERS).data)['timeouts']
+        try:
+            res = app.test_client().get('/questions')
+        finally:
+            for connection in held:
+                connection.close()
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.headers['Retry-After'], '1')
+        self.assertEqual(data['success'], False)
+
+        res = app.test_client().get('/pool/metrics',
+                                    headers=MONITORING_HEADERS)
+        data = json.loads(res.data)
+        self.assertEqual(data['timeouts'], timeouts + 1)
+        self.assertEqual(data['checked_out'], 0)
+
+    def replicated_app(self):
+        '''An app on two SQLite files standing in for primary and replica'''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        primary_path = 'sqlite:///' + os.path.join(directory, 'primary.db')
+        replica_path = 'sqlite:///' + os.path.join(directory, 'replica.db')
+        app = create_app()
+        setup_db(app, primary_path, [replica_path])
+        with app.app_context():
+            for bind in (None, 'replica_0'):
+                engine = db.get_engine(app, bind)
+                db.metadata.create_all(engine)
+                engine.execute(Category.__table__.insert(),
+                               {'id': 1, 'type': 'Science'})
+                engine.execute(Question.__table__.insert(), {
+                    'question': 'Where am I?',
+                    'answer': 'replica' if bind else 'primary',
+                    'category': 1, 'difficulty': 1})
+        return app
+
+    def test_reads_routed_to_replica(self):
+        app = self.replicated_app()
+
+        res = app.test_client().get('/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [question['answer'] for question in data['questions']],
+            ['replica'])
+
+    def test_pool_metrics_kept_per_engine(self):
+        app = self.replicated_app()
+        app.config['MONITORING_TOKEN'] = MONITORING_TOKEN
+        client = app.test_client()
+        client.get('/questions')  # fills the caches, read from the primary
+        before = json.loads(client.get(
+            '/pool/metrics', headers=MONITORING_HEADERS).data)
+
+        client.get('/questions')
+        data = json.loads(client.get(
+            '/pool/metrics', headers=MONITORING_HEADERS).data)
+
+        self.assertEqual(data['checkouts'], before['checkouts'])
+        self.assertGreater(data['binds']['replica_0']['checkouts'],
+                           before['binds']['replica_0']['checkouts'])
+
+    def test_writes_routed_to_primary(self):
+        app = self.replicated_app()
+
+        res = app.test_client().post('/questions', json={
+            'question': 'Written?', 'answer': 'Yes',
+            'category': 1, 'difficulty': 1})
+
+        self.assertEqual(res.status_code, 200)
+        with app.app_context():
+            primary = db.get_engine(app).execute(
+                'SELECT count(*) FROM questions').scalar()
+            replica = db.get_engine(app, 'replica_0').execute(
+                'SELECT count(*) FROM questions').scalar()
+        self.assertEqual((primary, replica), (2, 1))
+
+    def test_session_reads_its_own_writes(self):
+        app = self.replicated_app()
+
+        with app.app_context():
+            self.assertEqual(Question.query.count(), 1)
+            Question('Written?', 'Yes', 1, 1).insert()
+            self.assertEqual(Question.query.count(), 2)
+            db.session.remove()
+            # a new session reads from the replica again
+            self.assertEqual(Question.query.count(), 1)
+
+    def test_reads_fall_back_to_primary_without_healthy_replica(self):
+        app = self.replicated_app()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        app.config['SQLALCHEMY_BINDS']['replica_0'] = 'sqlite:///' + \
+            os.path.join(directory, 'missing', 'replica.db')
+
+        res = app.test_client().get('/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [question['answer'] for question in data['questions']],
+            ['primary'])
+
+    def test_caches_rebuilt_from_primary_not_lagging_replica(self):
+        app = self.replicated_app()
+        self.addCleanup(category_cache.invalidate)
+        self.addCleanup(question_index.invalidate)
+        with app.app_context():
+            # committed on the primary, not yet replicated
+            db.session.add(Category('Art'))
+            db.session.commit()
+            question = Question('Only on the primary?', 'Yes', 1, 1)
+            question.insert()
+            question_id = question.id
+            db.session.remove()
+
+            self.assertEqual(sorted(question_index.ids(1)), [1, question_id])
+
+        res = app.test_client().get('/categories')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([category['type'] for category in data['categories']],
+                         ['Science', 'Art'])
+
+    def test_replica_check_does_not_block_requests(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        engine = create_engine(
+            'sqlite:///' + os.path.join(directory, 'replica.db'))
+        self.addCleanup(engine.dispose)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        replicas = ReplicaSet(['replica_0'], check_interval=0,
+                              check_timeout=0.05)
+
+        # a replica that does not answer its first check counts as down
+        event.listen(engine, 'connect', lambda *args: release.wait(5))
+        started = time.monotonic()
+        self.assertIsNone(replicas.choose(lambda key: engine))
+        self.assertLess(time.monotonic() - started, 1)
+
+        # once answered, later checks run while the last result is used
+        release.set()
+        replicas._checks['replica_0'].join(5)
+        release.clear()
+        started = time.monotonic()
+        self.assertIs(replicas.choose(lambda key: engine), engine)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def explain(self, statement):
+        '''The database's plan for a Core statement, as text'''
+        sql = str(statement.compile(
+            db.engine, compile_kwargs={'literal_binds': True}))
+        if db.engine.dialect.name == 'sqlite':
+            plan = db.session.execute('EXPLAIN QUERY PLAN ' + sql)
+        else:
+            # the test table is small enough for a sequential scan to win
+            db.session.execute('SET LOCAL enable_seqscan = off')
+            plan = db.session.execute('EXPLAIN ' + sql)
+        plan = '\n'.join(' '.join(map(str, row)) for row in plan)
+        db.session.rollback()
+        return plan
+
+    def test_category_questions_use_index(self):
+        # the listing of GET /categories/<id>/questions
+        plan = self.explain(select_questions(Question.category == 1))
+
+        self.assertIn('ix_questions_category_id', plan)
+
+    def test_quiz_questions_use_index(self):
+        # what QuestionIndex is rebuilt from; the index covers it
+        plan = self.explain(select_question_categories())
+
+        self.assertIn('ix_questions_category_id', plan)
+
     def test_get_quizzes(self):
-        res = self.client().post('/quizzes', json={"quiz_category": {'id': 0}})
+        with self.assertQueryBudget():
+            res = self.client().post('/quizzes',
+                                     json={"quiz_category": {'id': 0}})
         data = json.loads(res.data)
 
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
 
+    def test_get_quizzes_skips_previous_questions(self):
+        with self.assertQueryBudget():
+            res = self.client().get('/categories/1/questions')
+        ids = [question['id']
+               for question in json.loads(res.data)['questions']]
+
+        res = self.client().post('/quizzes', json={
+            "quiz_category": {'id': 1},
+            "previous_questions": ids[1:]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], ids[0])
+
+    def test_get_quizzes_all_questions_played(self):
+        res = self.client().get('/categories/1/questions')
+        ids = [question['id']
+               for question in json.loads(res.data)['questions']]
+
+        res = self.client().post('/quizzes', json={
+            "quiz_category": {'id': 1},
+            "previous_questions": ids})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question'], False)
+
+    @unittest.skipUnless(asgi, 'requirements-async.txt is not installed')
+    def test_async_app_matches_sync_app(self):
+        requests = [
+            ('GET', '/categories', None),
+            ('GET', '/questions?page=1', None),
+            ('GET', '/categories/1/questions', None),
+            ('POST', '/questions', {'searchTerm': 'title'}),
+            ('GET', '/categories/1000/questions', None),
+        ]
+        async_app = asgi.create_app(database_url=self.database_path)
+
+        async def get_responses():
+            async with async_app.test_app() as test_app:
+                client = test_app.test_client()
+                responses = []
+                for method, path, body in requests:
+                    res = await client.open(path, method=method, json=body)
+                    responses.append((res.status_code, await res.get_json()))
+                return responses
+
+        for (method, path, body), (status_code, data) in zip(
+                requests, asyncio.run(get_responses())):
+            res = self.client().open(path, method=method, json=body)
+            self.assertEqual(status_code, res.status_code)
+            self.assertEqual(data, json.loads(res.data))
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
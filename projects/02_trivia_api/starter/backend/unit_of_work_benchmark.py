@@ -0,0 +1,76 @@
+'''
+Benchmark of Question.insert() for --rows questions: committed one by
+one, as outside a unit of work, against all of them in one
+unit_of_work(). Reports the total time of each.
+
+    python unit_of_work_benchmark.py --rows 10000
+
+The questions are written to a temporary SQLite file unless a database
+URL is given; its questions table is emptied before each run.
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from flask import Flask
+
+from models import setup_db, db, unit_of_work, Question
+
+
+def insert_questions(rows):
+    for n in range(rows):
+        Question(question='Question number {}?'.format(n),
+                 answer='Answer {}'.format(n), category=n % 6 + 1,
+                 difficulty=n % 5 + 1).insert()
+
+
+def elapsed(function, rows):
+    '''Seconds to insert rows questions into an empty table'''
+    db.session.query(Question).delete()
+    db.session.commit()
+    started = time.perf_counter()
+    function(rows)
+    seconds = time.perf_counter() - started
+    assert Question.total() == rows
+    db.session.remove()
+    return seconds
+
+
+def in_unit_of_work(rows):
+    with unit_of_work():
+        insert_questions(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('database_url', nargs='?')
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    directory = None
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp()
+        database_url = 'sqlite:///' + os.path.join(directory, 'uow.db')
+    app = Flask(__name__)
+    try:
+        setup_db(app, database_url)
+        with app.app_context():
+            results = [
+                ('commit per insert', elapsed(insert_questions, args.rows)),
+                ('unit_of_work()', elapsed(in_unit_of_work, args.rows)),
+            ]
+            db.engine.dispose()
+    finally:
+        if directory:
+            shutil.rmtree(directory)
+
+    print('{} questions'.format(args.rows))
+    for name, seconds in results:
+        print('  {:18} {:8.2f} s'.format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
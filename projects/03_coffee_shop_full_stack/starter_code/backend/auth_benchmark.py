@@ -0,0 +1,137 @@
+'''
+Benchmark of token verification in requires_auth, with a 2048-bit RS256
+token signed by a key generated for the run:
+
+- verify_decode_jwt() downloading the key set on every call, as it did
+  before the keys were cached, from a local stand-in of
+  /.well-known/jwks.json
+- verify_decode_jwt() with the keys cached in jwks_cache
+- a token_cache lookup of a token already verified
+- GET /drinks-detail through the Flask test client, verifying the token
+  on every request and serving it from token_cache
+
+    python auth_benchmark.py --iterations 2000
+
+Reports operations per second over --iterations calls of each.
+'''
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from jose import jwt
+
+from fsnd_common.auth import JWKSCache, TokenCache
+
+from src.api import app
+from src.auth import auth
+from src.database.models import db, Drink
+from test_api import generate_signing_key
+
+
+def serve_jwks(jwks):
+    '''Serves jwks on a local port; returns the server and its url'''
+    body = json.dumps(jwks).encode('utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}/.well-known/jwks.json'.format(
+        server.server_port)
+
+
+def signed_token():
+    private_key, jwks = generate_signing_key()
+    kid = jwks['keys'][0]['kid']
+    token = jwt.encode({
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'exp': int(time.time()) + 3600,
+        'permissions': ['get:drinks-detail']
+    }, private_key, algorithm='RS256', headers={'kid': kid})
+    return token, jwks
+
+
+def rate(function, iterations):
+    '''Calls per second of function over iterations calls'''
+    function()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return iterations / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    token, jwks = signed_token()
+    server, url = serve_jwks(jwks)
+    directory = tempfile.mkdtemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        directory, 'auth.db')
+    headers = {'Authorization': 'Bearer ' + token}
+    client = app.test_client()
+
+    def fetching_verify():
+        auth.jwks_cache = JWKSCache(url)
+        auth.verify_decode_jwt(token)
+
+    def uncached_request():
+        auth.token_cache.clear()
+        assert client.get('/drinks-detail', headers=headers).status_code \
+            == 200
+
+    def cached_request():
+        assert client.get('/drinks-detail', headers=headers).status_code \
+            == 200
+
+    try:
+        with app.app_context():
+            db.create_all()
+            Drink(title='Water', recipe=json.dumps([
+                {'name': 'water', 'color': 'blue', 'parts': 1}])).insert()
+
+        auth.token_cache = TokenCache()
+        results = [('verify, fetching keys', rate(fetching_verify,
+                                                  args.iterations))]
+        auth.jwks_cache = JWKSCache(url)
+        results.append(('verify, cached keys', rate(
+            lambda: auth.verify_decode_jwt(token), args.iterations)))
+        auth.token_cache.put(token, auth.verify_decode_jwt(token))
+        results.append(('token_cache hit', rate(
+            lambda: auth.token_cache.get(token), args.iterations)))
+        results.append(('request, verifying', rate(uncached_request,
+                                                   args.iterations)))
+        results.append(('request, token_cache', rate(cached_request,
+                                                     args.iterations)))
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(directory)
+
+    print('RS256 2048-bit token, {} iterations'.format(args.iterations))
+    for name, per_second in results:
+        print('  {:22} {:10.0f} /s'.format(name, per_second))
+
+
+if __name__ == '__main__':
+    main()
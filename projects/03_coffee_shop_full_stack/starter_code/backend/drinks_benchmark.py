@@ -0,0 +1,95 @@
+'''
+Benchmark of the drink listings: short() and long() of every Drink loaded
+through the ORM against list_drinks(), which builds the same dicts from a
+Core select. Reports the best time of --repeat runs and the tracemalloc
+peak, over --rows drinks in a temporary SQLite database.
+
+    python drinks_benchmark.py --rows 10000
+
+Both paths must give the same output.
+'''
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from flask import Flask
+
+from src.database.models import setup_db, db, Drink, list_drinks
+
+RECIPE = json.dumps([
+    {'name': 'water', 'color': 'blue', 'parts': 1},
+    {'name': 'milk', 'color': 'white', 'parts': 2},
+    {'name': 'coffee', 'color': 'brown', 'parts': 1},
+])
+
+
+def measure(function, repeat):
+    '''Best time of repeat calls, in seconds, and peak memory, in bytes'''
+    function()
+    db.session.remove()
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+        db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    output = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.remove()
+    return output, best, peak
+
+
+def orm_listing(representation):
+    drinks = Drink.query.order_by(Drink.id).all()
+    if representation == 'short':
+        return [drink.short() for drink in drinks]
+    return [drink.long() for drink in drinks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    app = Flask(__name__)
+    setup_db(app)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        directory, 'drinks.db')
+    results = []
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.execute(Drink.__table__.insert(), [
+                {'title': 'Drink {}'.format(n), 'recipe': RECIPE}
+                for n in range(args.rows)])
+            db.session.commit()
+            for representation in ('short', 'long'):
+                orm = measure(lambda: orm_listing(representation),
+                              args.repeat)
+                core = measure(lambda: list_drinks(representation),
+                               args.repeat)
+                assert orm[0] == core[0], 'the two listings differ'
+                results.append((representation, orm[1:], core[1:]))
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+    print('{} drinks, best of {}'.format(args.rows, args.repeat))
+    for representation, orm, core in results:
+        for name, (seconds, peak) in (('ORM', orm), ('list_drinks', core)):
+            print('  {:6} {:12} {:8.1f} ms  peak {:6.1f} MB'.format(
+                representation, name, seconds * 1000, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+'''
+Benchmark of the recipe cache on the GET /drinks and /drinks-detail path:
+list_drinks() parsing every recipe on every call, as before the cache,
+against list_drinks() with the _parsed_recipe() cache cleared (cold) and
+filled by an earlier call (warm), the steady state between requests.
+Reports the best time of --repeat runs over --rows drinks, each with its
+own recipe, in a temporary SQLite database.
+
+    python recipe_benchmark.py --rows 10000
+
+With more drinks than RECIPE_CACHE_SIZE (try --rows 30000) a listing
+evicts the recipes it needs next, and the warm listing becomes slower
+than parsing.
+'''
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from flask import Flask
+
+from src.database import models
+from src.database.models import setup_db, db, Drink, list_drinks
+
+
+def recipe(n):
+    return json.dumps([
+        {'name': 'water', 'color': 'blue', 'parts': n % 3 + 1},
+        {'name': 'milk', 'color': 'white', 'parts': n % 5 + 1},
+        {'name': 'coffee', 'color': 'brown', 'parts': n + 1},
+    ])
+
+
+def parsing_list_drinks(representation='short'):
+    '''list_drinks() before the recipe cache'''
+    table = Drink.__table__
+    rows = db.session.execute(
+        db.select([table.c.id, table.c.title, table.c.recipe])
+        .order_by(table.c.id))
+    drinks = []
+    for id, title, recipe in rows:
+        recipe = json.loads(recipe)
+        if representation == 'short':
+            recipe = models._short_recipe(recipe)
+        drinks.append({'id': id, 'title': title, 'recipe': recipe})
+    return drinks
+
+
+def best(function, repeat, cold=False):
+    '''Best time of repeat calls, in seconds, and the last output'''
+    result = float('inf')
+    for _ in range(repeat):
+        if cold:
+            models._parsed_recipe.cache_clear()
+        started = time.perf_counter()
+        output = function()
+        result = min(result, time.perf_counter() - started)
+        db.session.remove()
+    return output, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    app = Flask(__name__)
+    setup_db(app)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        directory, 'recipes.db')
+    results = []
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.execute(Drink.__table__.insert(), [
+                {'title': 'Drink {}'.format(n), 'recipe': recipe(n)}
+                for n in range(args.rows)])
+            db.session.commit()
+            for representation in ('short', 'long'):
+                parsing = best(lambda: parsing_list_drinks(representation),
+                               args.repeat)
+                cold = best(lambda: list_drinks(representation), args.repeat,
+                            cold=True)
+                warm = best(lambda: list_drinks(representation), args.repeat)
+                assert parsing[0] == cold[0] == warm[0], \
+                    'the listings differ'
+                results.append((representation, parsing, cold, warm))
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+    print('{} drinks, {} cached recipes, best of {}'.format(
+        args.rows, models.RECIPE_CACHE_SIZE, args.repeat))
+    for representation, *listings in results:
+        for name, (_, seconds) in zip(('parsing', 'cold', 'warm'), listings):
+            print('  {:6} {:8} {:8.1f} ms'.format(
+                representation, name, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
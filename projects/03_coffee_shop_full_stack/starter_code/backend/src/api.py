@@ -3,13 +3,25 @@ from flask import Flask, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
+from fsnd_common.instrumentation import init_metrics
+from fsnd_common.json_backend import init_json
+from fsnd_common.monitoring import requires_monitoring_token
+from fsnd_common.pool import pools_snapshot
+from fsnd_common.query_budget import init_query_budget, query_budget
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, db, Drink, list_drinks
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
+# orjson unless the JSON_BACKEND environment variable is 'json'
+init_json(app)
+# GET /metrics when the METRICS_ENABLED environment variable is set
+init_metrics(app)
+# Logs or fails requests over their @query_budget when the QUERY_BUDGET_MODE
+# environment variable is 'warn' or 'fail'
+init_query_budget(app)
 
 '''
 @TODO uncomment the following line to initialize the datbase
@@ -20,23 +32,30 @@ CORS(app)
 
 ## ROUTES
 '''
-@TODO implement endpoint
-    GET /drinks
-        it should be a public endpoint
-        it should contain only the drink.short() data representation
+GET /drinks
+    it should be a public endpoint
+    it should contain only the drink.short() data representation
     returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks')
+@query_budget(1)
+def get_drinks():
+    return jsonify({"success": True, "drinks": list_drinks('short')})
 
 
 '''
-@TODO implement endpoint
-    GET /drinks-detail
-        it should require the 'get:drinks-detail' permission
-        it should contain the drink.long() data representation
+GET /drinks-detail
+    it should require the 'get:drinks-detail' permission
+    it should contain the drink.long() data representation
     returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks-detail')
+@query_budget(1)
+@requires_auth('get:drinks-detail')
+def get_drinks_detail(payload):
+    return jsonify({"success": True, "drinks": list_drinks('long')})
 
 
 '''
@@ -75,7 +94,32 @@ CORS(app)
 '''
 
 
+'''
+GET /pool/metrics
+    connections in use and checkout latency of the database pool
+    it should require an `Authorization: Bearer <MONITORING_TOKEN>` header,
+        and is not served while MONITORING_TOKEN is unset
+    returns status code 200 and json {"success": True, ...metrics}
+'''
+@app.route('/pool/metrics')
+@query_budget(0)
+@requires_monitoring_token
+def get_pool_metrics():
+    return jsonify(dict(pools_snapshot(db, app), success=True))
+
+
 ## Error Handling
+'''
+no database connection became free within DB_POOL_TIMEOUT
+'''
+@app.errorhandler(exc.TimeoutError)
+def pool_exhausted(error):
+    return jsonify({
+                    "success": False,
+                    "error": 503,
+                    "message": "service unavailable"
+                    }), 503, {'Retry-After': '1'}
+
 '''
 Example error handling for unprocessable entity
 '''
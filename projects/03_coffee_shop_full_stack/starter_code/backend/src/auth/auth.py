@@ -1,8 +1,9 @@
-import json
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from fsnd_common.auth import JWKSCache, TokenCache
+from fsnd_common.instrumentation import timed
 
 
 AUTH0_DOMAIN = 'udacity-fsnd.auth0.com'
@@ -31,7 +32,33 @@ class AuthError(Exception):
     return the token part of the header
 '''
 def get_token_auth_header():
-   raise Exception('Not Implemented')
+    auth = request.headers.get('Authorization', None)
+    if not auth:
+        raise AuthError({
+            'code': 'authorization_header_missing',
+            'description': 'Authorization header is expected.'
+        }, 401)
+
+    parts = auth.split()
+    if parts[0].lower() != 'bearer':
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must start with "Bearer".'
+        }, 401)
+
+    elif len(parts) == 1:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Token not found.'
+        }, 401)
+
+    elif len(parts) > 2:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must be bearer token.'
+        }, 401)
+
+    return parts[1]
 
 '''
 @TODO implement check_permissions(permission, payload) method
@@ -43,9 +70,25 @@ def get_token_auth_header():
         !!NOTE check your RBAC settings in Auth0
     it should raise an AuthError if the requested permission string is not in the payload permissions array
     return true otherwise
+
+    permissions: optional precomputed set of the payload permissions,
+        as kept by token_cache, which makes the check a set lookup
 '''
-def check_permissions(permission, payload):
-    raise Exception('Not Implemented')
+def check_permissions(permission, payload, permissions=None):
+    if 'permissions' not in payload:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Permissions not included in JWT.'
+        }, 400)
+
+    if permissions is None:
+        permissions = frozenset(payload['permissions'])
+    if permission not in permissions:
+        raise AuthError({
+            'code': 'unauthorized',
+            'description': 'Permission not found.'
+        }, 403)
+    return True
 
 '''
 @TODO implement verify_decode_jwt(token) method
@@ -59,9 +102,56 @@ def check_permissions(permission, payload):
     return the decoded payload
 
     !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
+
+    the signing keys are looked up by kid in jwks_cache, which downloads
+    /.well-known/jwks.json when its keys expire or a kid is unknown
 '''
+jwks_cache = JWKSCache(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+
 def verify_decode_jwt(token):
-    raise Exception('Not Implemented')
+    unverified_header = jwt.get_unverified_header(token)
+    if 'kid' not in unverified_header:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization malformed.'
+        }, 401)
+
+    rsa_key = jwks_cache.get_key(unverified_header['kid'])
+    if rsa_key:
+        try:
+            return jwt.decode(
+                token,
+                rsa_key,
+                algorithms=ALGORITHMS,
+                audience=API_AUDIENCE,
+                issuer='https://' + AUTH0_DOMAIN + '/'
+            )
+
+        except jwt.ExpiredSignatureError:
+            raise AuthError({
+                'code': 'token_expired',
+                'description': 'Token expired.'
+            }, 401)
+
+        except jwt.JWTClaimsError:
+            raise AuthError({
+                'code': 'invalid_claims',
+                'description': 'Incorrect claims. Please, check the audience and issuer.'
+            }, 401)
+
+        except Exception:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+
+    raise AuthError({
+        'code': 'invalid_header',
+        'description': 'Unable to find the appropriate key.'
+    }, 400)
+
+token_cache = TokenCache()
 
 '''
 @TODO implement @requires_auth(permission) decorator method
@@ -70,6 +160,7 @@ def verify_decode_jwt(token):
 
     it should use the get_token_auth_header method to get the token
     it should use the verify_decode_jwt method to decode the jwt
+        tokens already verified are served from token_cache instead
     it should use the check_permissions method validate claims and check the requested permission
     return the decorator which passes the decoded payload to the decorated method
 '''
@@ -78,8 +169,13 @@ def requires_auth(permission=''):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            cached = token_cache.get(token)
+            if cached is None:
+                with timed('jwt_verify'):
+                    payload = verify_decode_jwt(token)
+                cached = token_cache.put(token, payload)
+            payload, permissions = cached
+            check_permissions(permission, payload, permissions)
             return f(payload, *args, **kwargs)
 
         return wrapper
@@ -1,6 +1,8 @@
 import os
+from contextlib import contextmanager
+from functools import lru_cache
 from sqlalchemy import Column, String, Integer
-from flask_sqlalchemy import SQLAlchemy
+from fsnd_common.pool import SQLAlchemy
 import json
 
 database_filename = "database.db"
@@ -12,6 +14,8 @@ db = SQLAlchemy()
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    the connection pool is configured from the DB_POOL_* settings of the
+    app config or the environment, see fsnd_common.pool
 '''
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
@@ -29,6 +33,59 @@ def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
 
+'''
+unit_of_work()
+    groups the insert(), update() and delete() calls made inside it into a
+    single transaction, committed when the block exits and rolled back if
+    it raises; nested blocks join the outermost one
+    EXAMPLE
+        with unit_of_work():
+            for title, recipe in drinks:
+                Drink(title=title, recipe=recipe).insert()
+'''
+@contextmanager
+def unit_of_work():
+    session = db.session
+    depth = session.info.get('unit_of_work', 0)
+    session.info['unit_of_work'] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except BaseException:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info['unit_of_work'] = depth
+
+def _commit():
+    # outside a unit of work every change is committed on its own
+    if not db.session.info.get('unit_of_work'):
+        db.session.commit()
+
+# Distinct recipe blobs whose parsed forms are kept, see _parsed_recipe()
+RECIPE_CACHE_SIZE = 16384
+
+'''
+_short_recipe(recipe)
+    the color and parts of each ingredient of a parsed recipe
+'''
+def _short_recipe(recipe):
+    return [{'color': r['color'], 'parts': r['parts']} for r in recipe]
+
+'''
+_parsed_recipe(recipe)
+    the parsed recipe blob and its short projection (color and parts only)
+    cached for the process, keyed by the blob itself, so an edited recipe
+    is a new key and drinks are served across requests without parsing
+    !!NOTE the returned lists are shared, treat them as read-only
+'''
+@lru_cache(maxsize=RECIPE_CACHE_SIZE)
+def _parsed_recipe(recipe):
+    parsed = json.loads(recipe)
+    return parsed, _short_recipe(parsed)
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -47,12 +104,10 @@ class Drink(db.Model):
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': _parsed_recipe(self.recipe)[1]
         }
 
     '''
@@ -63,7 +118,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': _parsed_recipe(self.recipe)[0]
         }
 
     '''
@@ -71,13 +126,14 @@ class Drink(db.Model):
         inserts a new model into a database
         the model must have a unique name
         the model must have a unique id or null id
+        commits at once, or with the enclosing unit_of_work()
         EXAMPLE
             drink = Drink(title=req_title, recipe=req_recipe)
             drink.insert()
     '''
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        _commit()
 
     '''
     delete()
@@ -89,7 +145,7 @@ class Drink(db.Model):
     '''
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
+        _commit()
 
     '''
     update()
@@ -101,7 +157,25 @@ class Drink(db.Model):
             drink.update()
     '''
     def update(self):
-        db.session.commit()
+        _commit()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return json.dumps(self.short())
+
+'''
+list_drinks(representation)
+    the short() or long() form of every drink, ordered by id, built from a
+    Core select of the id, title and recipe columns without loading Drink
+    objects into the session, with the recipes of _parsed_recipe(); for
+    read-only listings
+    representation is either 'short' or 'long'
+    EXAMPLE
+        list_drinks('long')
+'''
+def list_drinks(representation='short'):
+    table = Drink.__table__
+    rows = db.session.execute(
+        db.select([table.c.id, table.c.title, table.c.recipe]).order_by(table.c.id))
+    form = 1 if representation == 'short' else 0
+    return [{'id': id, 'title': title, 'recipe': _parsed_recipe(recipe)[form]}
+            for id, title, recipe in rows]
@@ -0,0 +1,158 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from urllib.parse import quote
+
+from jose import jwt
+
+from fsnd_common.auth import JWKSCache, TokenCache
+from fsnd_common.query_budget import QueryBudgetTestMixin, count_queries
+
+from src.api import app
+from src.auth import auth
+from src.database import models
+from src.database.models import db, Drink, list_drinks
+
+KID = 'test-key'
+
+
+def base64url_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def generate_signing_key():
+    """Returns a private key in PEM and a key set publishing its public key"""
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        # The pinned python-jose-cryptodome signs with pycryptodome
+        from Crypto.PublicKey import RSA
+        key = RSA.generate(2048)
+        private_key, n, e = key.exportKey('PEM'), key.n, key.e
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_key = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption())
+        n, e = key.public_key().public_numbers().n, 65537
+    return private_key.decode('ascii'), {'keys': [{
+        'kty': 'RSA', 'kid': KID, 'use': 'sig', 'alg': 'RS256',
+        'n': base64url_uint(n), 'e': base64url_uint(e)}]}
+
+
+class CoffeeShopTestCase(QueryBudgetTestMixin, unittest.TestCase):
+    """This class represents the coffee shop test case"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key, cls.jwks = generate_signing_key()
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+            directory, 'database.db')
+        self.app = app
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.create_all()
+            for title, recipe in (
+                    ('Water', [{'name': 'water', 'color': 'blue',
+                                'parts': 1}]),
+                    ('Latte', [{'name': 'milk', 'color': 'white',
+                                'parts': 3},
+                               {'name': 'coffee', 'color': 'brown',
+                                'parts': 1}])):
+                Drink(title=title, recipe=json.dumps(recipe)).insert()
+
+        # The key set is served from a data: url instead of Auth0
+        jwks_cache, token_cache = auth.jwks_cache, auth.token_cache
+        auth.jwks_cache = JWKSCache(
+            'data:application/json,' + quote(json.dumps(self.jwks)))
+        auth.token_cache = TokenCache()
+        self.addCleanup(setattr, auth, 'jwks_cache', jwks_cache)
+        self.addCleanup(setattr, auth, 'token_cache', token_cache)
+
+    def auth_headers(self, permissions):
+        token = jwt.encode({
+            'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+            'aud': auth.API_AUDIENCE,
+            'exp': int(time.time()) + 3600,
+            'permissions': permissions
+        }, self.private_key, algorithm='RS256', headers={'kid': KID})
+        return {'Authorization': 'Bearer ' + token}
+
+    def tearDown(self):
+        """Executed after reach test"""
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_get_drinks(self):
+        res = self.client().get('/drinks')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        with self.app.app_context():
+            self.assertEqual(data['drinks'], [
+                drink.short() for drink in Drink.query.order_by(Drink.id)])
+        self.assertEqual(data['drinks'][1]['recipe'], [
+            {'color': 'white', 'parts': 3}, {'color': 'brown', 'parts': 1}])
+
+    def test_recipes_parsed_once_across_requests(self):
+        models._parsed_recipe.cache_clear()
+        self.client().get('/drinks')
+        misses = models._parsed_recipe.cache_info().misses
+
+        res = self.client().get('/drinks')
+
+        self.assertEqual(res.status_code, 200)
+        info = models._parsed_recipe.cache_info()
+        self.assertEqual(info.misses, misses)
+        self.assertEqual(info.hits, len(json.loads(res.data)['drinks']))
+
+    def test_get_drinks_detail(self):
+        res = self.client().get('/drinks-detail', headers=self.auth_headers(
+            ['get:drinks-detail']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['drinks'][0]['recipe'], [
+            {'name': 'water', 'color': 'blue', 'parts': 1}])
+
+    def test_token_verified_once(self):
+        headers = self.auth_headers(['get:drinks-detail'])
+
+        for _ in range(3):
+            res = self.client().get('/drinks-detail', headers=headers)
+            self.assertEqual(res.status_code, 200)
+
+        self.assertEqual(auth.jwks_cache.stats()['refreshes'], 1)
+        self.assertEqual(auth.token_cache.stats()['hits'], 2)
+
+    def test_drinks_within_query_budget(self):
+        with self.assertQueryBudget():
+            self.client().get('/drinks')
+
+    def test_list_drinks_runs_one_query(self):
+        with self.app.app_context():
+            for representation in ('short', 'long'):
+                with count_queries() as log:
+                    drinks = list_drinks(representation)
+
+                self.assertEqual(len(drinks), 2)
+                self.assertEqual(log.count(), 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
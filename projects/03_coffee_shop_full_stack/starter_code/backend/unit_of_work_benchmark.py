@@ -0,0 +1,71 @@
+'''
+Benchmark of Drink.insert() for --rows drinks: committed one by one, as
+outside a unit of work, against all of them in one unit_of_work().
+Reports the total time of each, on a temporary SQLite database.
+
+    python unit_of_work_benchmark.py --rows 10000
+'''
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from flask import Flask
+
+from src.database.models import setup_db, db, unit_of_work, Drink
+
+RECIPE = json.dumps([{'name': 'water', 'color': 'blue', 'parts': 1}])
+
+
+def insert_drinks(rows):
+    for n in range(rows):
+        Drink(title='Drink {}'.format(n), recipe=RECIPE).insert()
+
+
+def in_unit_of_work(rows):
+    with unit_of_work():
+        insert_drinks(rows)
+
+
+def elapsed(function, rows):
+    '''Seconds to insert rows drinks into an empty table'''
+    Drink.query.delete()
+    db.session.commit()
+    started = time.perf_counter()
+    function(rows)
+    seconds = time.perf_counter() - started
+    assert Drink.query.count() == rows
+    db.session.remove()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    app = Flask(__name__)
+    setup_db(app)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+        directory, 'uow.db')
+    try:
+        with app.app_context():
+            db.create_all()
+            results = [
+                ('commit per insert', elapsed(insert_drinks, args.rows)),
+                ('unit_of_work()', elapsed(in_unit_of_work, args.rows)),
+            ]
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+    print('{} drinks'.format(args.rows))
+    for name, seconds in results:
+        print('  {:18} {:8.2f} s'.format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()